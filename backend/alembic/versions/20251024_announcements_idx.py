@@ -0,0 +1,25 @@
+"""index announcements by created_at for the public feed
+
+Revision ID: 20251024_announcements_idx
+Revises: 20251023_giftcodes
+Create Date: 2025-10-24 10:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "20251024_announcements_idx"
+down_revision = "20251023_giftcodes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_announcements_created_at", "announcements", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_announcements_created_at", table_name="announcements")
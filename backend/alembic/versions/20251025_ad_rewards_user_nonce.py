@@ -0,0 +1,25 @@
+"""make (user_id, nonce) unique on ad_rewards
+
+Revision ID: 20251025_ad_rewards_user_nonce
+Revises: 20251024_announcements_idx
+Create Date: 2025-10-25 10:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "20251025_ad_rewards_user_nonce"
+down_revision = "20251024_announcements_idx"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_unique_constraint("uq_ad_rewards_user_nonce", "ad_rewards", ["user_id", "nonce"])
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_ad_rewards_user_nonce", "ad_rewards", type_="unique")
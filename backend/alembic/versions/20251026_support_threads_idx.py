@@ -0,0 +1,29 @@
+"""index support threads for the open-thread lookup
+
+Revision ID: 20251026_support_threads_idx
+Revises: 20251025_ad_rewards_user_nonce
+Create Date: 2025-10-26 10:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "20251026_support_threads_idx"
+down_revision = "20251025_ad_rewards_user_nonce"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_support_threads_user_source_status",
+        "support_threads",
+        ["user_id", "source", "status", "updated_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_support_threads_user_source_status", table_name="support_threads")
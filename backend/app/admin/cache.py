@@ -13,6 +13,8 @@ except ImportError:  # pragma: no cover - optional dependency
 
 from .admin_settings import get_admin_settings
 
+CATALOG_VERSION_KEY = "admin:perms:catalog:version"
+
 
 class PermissionCache:
     def __init__(self, ttl_seconds: int = 60) -> None:
@@ -70,6 +72,16 @@ class PermissionCache:
         with self._lock:
             self._memory_store.pop(user_id, None)
 
+    def catalog_version(self) -> str | None:
+        """Shared version of the permission catalog; None without Redis."""
+        if self._redis is None:
+            return None
+        return self._redis.get(CATALOG_VERSION_KEY)
+
+    def bump_catalog_version(self) -> None:
+        if self._redis is not None:
+            self._redis.incr(CATALOG_VERSION_KEY)
+
     @staticmethod
     def _redis_key(user_id: UUID) -> str:
         return f"admin:perms:{user_id}"
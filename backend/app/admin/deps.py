@@ -98,6 +98,10 @@ def _resolve_permissions(db: Session, cache: PermissionCache, user_id: UUID) ->
     return values
 
 
+def user_has_permission(db: Session, user_id: UUID, code: str) -> bool:
+    return code in _resolve_permissions(db, get_permission_cache(), user_id)
+
+
 def require_admin_user(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
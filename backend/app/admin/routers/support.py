@@ -1,7 +1,5 @@
 ﻿from __future__ import annotations
 
-import asyncio
-import json
 from typing import List
 from uuid import UUID
 
@@ -20,7 +18,7 @@ from app.admin.schemas import (
 from app.deps import get_db, get_support_bus
 from app.models import SupportMessage, SupportThread, User
 from app.services.support import SupportService
-from app.services.support_event_bus import SupportEventBus
+from app.services.support_event_bus import SupportEventBus, encode_sse
 
 
 router = APIRouter(tags=["admin-support"])
@@ -151,29 +149,22 @@ async def admin_thread_events(
 ) -> StreamingResponse:
     service = SupportService(db)
     thread = service.get_thread(thread_id)
-    messages = service.thread_messages(thread)
-    initial_payload = SupportService.thread_payload(thread, messages)
-
-    queue = await support_bus.subscribe(thread.id)
+    # Subscribe before the snapshot so nothing published in between is lost.
+    subscriber = await support_bus.subscribe(thread.id)
+    try:
+        messages = service.thread_messages(thread)
+        initial_payload = SupportService.thread_payload(thread, messages)
+    except Exception:
+        await support_bus.unsubscribe(thread.id, subscriber)
+        raise
 
     async def event_generator():
         try:
-            yield _format_sse("thread.snapshot", initial_payload)
+            yield encode_sse("thread.snapshot", initial_payload)
             while True:
-                try:
-                    item = await asyncio.wait_for(queue.get(), timeout=25)
-                except asyncio.TimeoutError:
-                    yield ": ping\n\n"
-                    continue
-                event_type = item.get("event", "message")
-                data = item.get("data", {})
-                yield _format_sse(event_type, data)
+                frames = await subscriber.drain(wait_seconds=25)
+                yield b"".join(frames) if frames else b": ping\n\n"
         finally:
-            await support_bus.unsubscribe(thread.id, queue)
+            await support_bus.unsubscribe(thread.id, subscriber)
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
-
-
-def _format_sse(event: str, payload: dict) -> str:
-    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
-
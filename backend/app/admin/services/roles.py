@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import time
 from typing import Iterable, Sequence, List
 from uuid import UUID
 
@@ -8,6 +9,7 @@ from sqlalchemy import delete, select
 from sqlalchemy.orm import Session
 
 from ..audit import AuditContext, record_audit
+from ..cache import get_permission_cache
 from ..deps import invalidate_permission_cache_for_role
 from ..models import Permission, Role, RolePermission, UserRole
 from ..schemas import PermissionDTO, RoleCreate, RoleDTO, RolePermissionsUpdate, RoleUpdate
@@ -41,11 +43,41 @@ def _permissions_for_roles(db: Session, role_ids: Iterable[UUID]) -> dict[UUID,
     return mapping
 
 
+def permission_codes_for_role(db: Session, role_id: UUID) -> set[str]:
+    stmt = (
+        select(Permission.code)
+        .join(RolePermission, Permission.id == RolePermission.permission_id)
+        .where(RolePermission.role_id == role_id)
+    )
+    return set(db.scalars(stmt))
+
+
+_PERMISSION_CATALOG_TTL = 60.0
+# (expires_at, shared version, permissions). With Redis the version is bumped on
+# every change so other workers drop their copy on the next read; without it
+# the app runs as a single process and clearing the local copy is enough.
+_permission_catalog: tuple[float, str | None, List[PermissionDTO]] | None = None
+
+
+def invalidate_permission_catalog() -> None:
+    global _permission_catalog
+    _permission_catalog = None
+    get_permission_cache().bump_catalog_version()
 
 
 def list_all_permissions(db: Session) -> List[PermissionDTO]:
+    global _permission_catalog
+    cached = _permission_catalog
+    version = get_permission_cache().catalog_version()
+    if cached is not None and cached[0] > time.monotonic() and cached[1] == version:
+        return list(cached[2])
     records = list(db.scalars(select(Permission).order_by(Permission.code)))
-    return [PermissionDTO(id=record.id, code=record.code, description=record.description) for record in records]
+    permissions = [
+        PermissionDTO(id=record.id, code=record.code, description=record.description)
+        for record in records
+    ]
+    _permission_catalog = (time.monotonic() + _PERMISSION_CATALOG_TTL, version, permissions)
+    return list(permissions)
 
 def list_roles(db: Session) -> list[RoleDTO]:
     roles = list(db.scalars(select(Role).order_by(Role.name)))
@@ -140,9 +172,7 @@ def set_role_permissions(
     if not role:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Role not found.")
 
-    before = {
-        "permissions": [perm.code for perm in _permissions_for_roles(db, [role_id]).get(role_id, [])]
-    }
+    before = {"permissions": sorted(permission_codes_for_role(db, role_id))}
 
     desired_codes = {code.strip() for code in payload.permission_codes if code.strip()}
 
@@ -151,22 +181,24 @@ def set_role_permissions(
         for perm in db.scalars(select(Permission).where(Permission.code.in_(desired_codes))).all():
             existing_perms[perm.code] = perm
 
+    created_permission = False
     for code in desired_codes:
         if code not in existing_perms:
             perm = Permission(code=code)
             db.add(perm)
             db.flush()
             existing_perms[code] = perm
+            created_permission = True
 
     db.execute(delete(RolePermission).where(RolePermission.role_id == role_id))
     for code in sorted(desired_codes):
         perm = existing_perms[code]
         db.add(RolePermission(role_id=role_id, permission_id=perm.id))
     db.commit()
+    if created_permission:
+        invalidate_permission_catalog()
 
-    after = {
-        "permissions": [perm.code for perm in _permissions_for_roles(db, [role_id]).get(role_id, [])]
-    }
+    after = {"permissions": sorted(permission_codes_for_role(db, role_id))}
 
     record_audit(
         db,
@@ -5,7 +5,8 @@ from uuid import UUID
 from urllib.parse import urlparse
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
@@ -21,6 +22,10 @@ from app.models import Worker
 
 router = APIRouter(prefix="/ads", tags=["ads"])
 
+# AdsService is synchronous (Session, redis.Redis, httpx.Client). The async
+# routes below hand its calls to the threadpool so DB, Redis and Turnstile
+# round-trips never block the event loop.
+
 
 class PrepareRequest(BaseModel):
     placement: str = Field(..., max_length=32)
@@ -109,7 +114,7 @@ async def prepare_ads(
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     nonce_manager: AdsNonceManager = Depends(get_ads_nonce_manager),
-) -> JSONResponse:
+) -> ORJSONResponse:
     settings = get_settings()
     ip = _client_ip(request)
     user_agent = request.headers.get("user-agent", "")
@@ -137,7 +142,7 @@ async def prepare_ads(
     )
     service = _ads_service(request, db, nonce_manager)
     try:
-        result = service.prepare(user, ctx)
+        result = await run_in_threadpool(service.prepare, user, ctx)
     except HTTPException as exc:
         raise exc
     except Exception as exc:  # pragma: no cover - defensive logging
@@ -145,7 +150,7 @@ async def prepare_ads(
     data = dict(result)
     data.setdefault("provider", provider_value)
     data["deviceHash"] = device_hash
-    return JSONResponse(data)
+    return ORJSONResponse(data)
 
 
 class MonetagCompleteRequest(BaseModel):
@@ -161,11 +166,11 @@ async def ssv_callback(
     request: Request,
     db: Session = Depends(get_db),
     nonce_manager: AdsNonceManager = Depends(get_ads_nonce_manager),
-) -> JSONResponse:
+) -> ORJSONResponse:
     payload = await _extract_payload(request)
     service = _ads_service(request, db, nonce_manager)
-    response = service.handle_ssv(payload, ip=_client_ip(request))
-    return JSONResponse(response)
+    response = await run_in_threadpool(service.handle_ssv, payload, ip=_client_ip(request))
+    return ORJSONResponse(response)
 
 
 @router.post("/complete")
@@ -175,13 +180,14 @@ async def complete_ads(
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     nonce_manager: AdsNonceManager = Depends(get_ads_nonce_manager),
-) -> JSONResponse:
+) -> ORJSONResponse:
     provider = (payload.provider or "monetag").strip().lower()
     if provider != "monetag":
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported provider")
     service = _ads_service(request, db, nonce_manager)
     try:
-        result = service.complete_monetag(
+        result = await run_in_threadpool(
+            service.complete_monetag,
             user,
             nonce=payload.nonce,
             ticket=payload.ticket,
@@ -192,7 +198,7 @@ async def complete_ads(
         raise exc
     except Exception as exc:  # pragma: no cover - defensive logging
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to complete ads") from exc
-    return JSONResponse(result)
+    return ORJSONResponse(result)
 
 
 @router.get("/wallet")
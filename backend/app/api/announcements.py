@@ -3,9 +3,9 @@ from __future__ import annotations
 from typing import List
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import bindparam, func, select
 from sqlalchemy.orm import Session
 
 from app.deps import get_db
@@ -13,19 +13,13 @@ from app.models import Announcement
 
 router = APIRouter(prefix="/announcements", tags=["announcements"])
 
-
-def _clean_text(value: str | None) -> str | None:
-    if value is None:
-        return None
-    cleaned = value.strip()
-    return cleaned or None
+_BY_SLUG = select(Announcement).where(Announcement.slug == bindparam("slug"))
 
 
-def _clean_url(value: str | None) -> str | None:
-    if value is None:
+def _clean_text(value: str | None) -> str | None:
+    if not value:
         return None
-    cleaned = value.strip()
-    return cleaned or None
+    return value.strip() or None
 
 
 class AnnouncementAttachmentPublic(BaseModel):
@@ -54,7 +48,7 @@ def _summary(record: Announcement) -> AnnouncementSummaryPublic:
         slug=record.slug,
         title=record.title,
         excerpt=_clean_text(record.excerpt),
-        hero_image_url=_clean_url(record.hero_image_url),
+        hero_image_url=_clean_text(record.hero_image_url),
         created_at=record.created_at.isoformat() if record.created_at else None,
         updated_at=record.updated_at.isoformat() if record.updated_at else None,
     )
@@ -64,7 +58,7 @@ def _detail(record: Announcement) -> AnnouncementDetailPublic:
     attachments = [
         {"label": _clean_text(item.get("label")), "url": cleaned_url}
         for item in (record.attachments or [])
-        if (cleaned_url := _clean_url(item.get("url")))
+        if (cleaned_url := (item.get("url") or "").strip())
     ]
     return AnnouncementDetailPublic(
         **_summary(record).model_dump(),
@@ -73,9 +67,32 @@ def _detail(record: Announcement) -> AnnouncementDetailPublic:
     )
 
 
+def _feed_etag(db: Session, limit: int, offset: int) -> str:
+    total, last_updated = db.execute(
+        select(func.count(Announcement.id), func.max(Announcement.updated_at))
+    ).one()
+    stamp = last_updated.isoformat() if last_updated else "-"
+    return f'W/"{total}-{stamp}-{limit}-{offset}"'
+
+
 @router.get("", response_model=List[AnnouncementSummaryPublic])
-async def list_announcements(db: Session = Depends(get_db)) -> List[AnnouncementSummaryPublic]:
-    records = db.scalars(select(Announcement).order_by(Announcement.created_at.desc())).all()
+async def list_announcements(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+) -> List[AnnouncementSummaryPublic] | Response:
+    etag = _feed_etag(db, limit, offset)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    records = db.scalars(
+        select(Announcement)
+        .order_by(Announcement.created_at.desc())
+        .limit(limit)
+        .offset(offset)
+    ).all()
     return [_summary(record) for record in records]
 
 
@@ -89,8 +106,7 @@ async def get_announcement(announcement_id: UUID, db: Session = Depends(get_db))
 
 @router.get("/slug/{slug}", response_model=AnnouncementDetailPublic)
 async def get_announcement_by_slug(slug: str, db: Session = Depends(get_db)) -> AnnouncementDetailPublic:
-    stmt = select(Announcement).where(Announcement.slug == slug)
-    record = db.scalars(stmt).first()
+    record = db.execute(_BY_SLUG, {"slug": slug}).scalar_one_or_none()
     if not record:
         raise HTTPException(status_code=404, detail="Announcement not found")
     return _detail(record)
@@ -2,25 +2,33 @@
 
 import asyncio
 import json
+import logging
 from typing import Any, Dict, Iterable, List
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse, StreamingResponse
-
 from sqlalchemy.orm import Session
 
+from app.db import SessionLocal
 from app.deps import get_current_user, get_db, get_kyaro_assistant, get_support_bus
 from app.models import SupportMessage, SupportThread, User
 from app.services.kyaro import KyaroAssistant
 from app.services.rate_limiter import RateLimiter
 from app.services.settings_store import SettingsStore
 from app.services.support import SupportService
-from app.services.support_event_bus import SupportEventBus
+from app.services.support_event_bus import SupportEventBus, encode_sse
 
 router = APIRouter(prefix="/support", tags=["support"])
+logger = logging.getLogger(__name__)
+
+_support_rate_limiter: RateLimiter | None = None
 
-_support_rate_limiter = RateLimiter(requests=10, window_seconds=60)
+_SSE_PING = b": ping\n\n"
+
+# Strong references so pending assistant replies are not garbage collected.
+_reply_tasks: set[asyncio.Task] = set()
 
 
 def _message_payload(message: SupportMessage) -> Dict[str, Any]:
@@ -43,32 +51,30 @@ def _normalize_attachments(raw: Any) -> list[dict]:
     return []
 
 
-def _format_sse(event: str, payload: Dict[str, Any]) -> str:
-    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+def _message_event(message: SupportMessage) -> Dict[str, Any]:
+    return {
+        "event": "message.created",
+        "data": _message_payload(message),
+    }
 
 
-async def _publish_message_event(bus: SupportEventBus, thread_id: UUID, message: SupportMessage) -> None:
-    await bus.publish(
-        thread_id,
-        {
-            "event": "message.created",
-            "data": _message_payload(message),
+def _status_event(thread: SupportThread) -> Dict[str, Any]:
+    return {
+        "event": "thread.status",
+        "data": {
+            "thread_id": str(thread.id),
+            "status": thread.status,
+            "updated_at": thread.updated_at.isoformat() if thread.updated_at else None,
         },
-    )
+    }
+
+
+async def _publish_message_event(bus: SupportEventBus, thread_id: UUID, message: SupportMessage) -> None:
+    await bus.publish(thread_id, _message_event(message))
 
 
 async def _publish_status_event(bus: SupportEventBus, thread: SupportThread) -> None:
-    await bus.publish(
-        thread.id,
-        {
-            "event": "thread.status",
-            "data": {
-                "thread_id": str(thread.id),
-                "status": thread.status,
-                "updated_at": thread.updated_at.isoformat() if thread.updated_at else None,
-            },
-        },
-    )
+    await bus.publish(thread.id, _status_event(thread))
 
 
 @router.get("/threads")
@@ -97,9 +103,20 @@ async def get_thread(
     return JSONResponse(_thread_payload(thread, messages))
 
 
-def _ensure_rate_limit(user: User, scope: str) -> None:
+def _get_support_rate_limiter(request: Request) -> RateLimiter:
+    global _support_rate_limiter
+    if _support_rate_limiter is None:
+        _support_rate_limiter = RateLimiter(
+            requests=10,
+            window_seconds=60,
+            redis_client=getattr(request.app.state, "redis", None),
+        )
+    return _support_rate_limiter
+
+
+def _ensure_rate_limit(request: Request, user: User, scope: str) -> None:
     key = f"support:{scope}:{user.id}"
-    _support_rate_limiter.check(key)
+    _get_support_rate_limiter(request).check(key)
 
 
 def _kyaro_prompt(db: Session) -> str:
@@ -121,7 +138,7 @@ async def ask_kyaro(
     message = str(payload.get("message", "")).strip()
     if not message:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Message is required")
-    _ensure_rate_limit(user, "ai")
+    _ensure_rate_limit(request, user, "ai")
     service = SupportService(db)
     thread_identifier = payload.get("thread_id")
     new_thread_requested = bool(payload.get("new_thread"))
@@ -144,22 +161,65 @@ async def ask_kyaro(
     db.commit()
     await _publish_message_event(support_bus, thread.id, user_message)
 
-    history = service.thread_messages(thread)
+    history = list(service.thread_messages(thread))
     prompt = _kyaro_prompt(db)
-    reply_text = await assistant.generate_reply(system_prompt=prompt, history=list(history))
-    ai_message = service.add_message(thread=thread, sender="ai", content=reply_text, role="assistant")
-    service.set_thread_status(thread, "open")
-    db.commit()
-    await _publish_message_event(support_bus, thread.id, ai_message)
-    await _publish_status_event(support_bus, thread)
+    task = asyncio.create_task(
+        _generate_and_publish(thread.id, prompt, history, assistant, support_bus)
+    )
+    _reply_tasks.add(task)
+    task.add_done_callback(_reply_tasks.discard)
 
-    messages = service.thread_messages(thread)
-    return JSONResponse(_thread_payload(thread, messages))
+    return JSONResponse(_thread_payload(thread, history), status_code=status.HTTP_202_ACCEPTED)
+
+
+async def _generate_and_publish(
+    thread_id: UUID,
+    prompt: str,
+    history: List[SupportMessage],
+    assistant: KyaroAssistant,
+    support_bus: SupportEventBus,
+) -> None:
+    """Generate the Kyaro reply off the request path and deliver it over SSE.
+
+    Nothing awaits this task, so every failure is logged here and reported to
+    the thread's subscribers as a ``reply.failed`` event.
+    """
+    try:
+        reply_text = await assistant.generate_reply(system_prompt=prompt, history=history)
+        events = await run_in_threadpool(_store_reply, thread_id, reply_text)
+    except Exception as exc:
+        if isinstance(exc, HTTPException):
+            logger.warning("Kyaro reply failed for thread %s: %s", thread_id, exc.detail)
+        else:
+            logger.exception("Kyaro reply failed for thread %s", thread_id)
+        await support_bus.publish(
+            thread_id,
+            {
+                "event": "reply.failed",
+                "data": {"thread_id": str(thread_id), "detail": "Kyaro AI error"},
+            },
+        )
+        return
+    for event in events:
+        await support_bus.publish(thread_id, event)
+
+
+def _store_reply(thread_id: UUID, reply_text: str) -> List[Dict[str, Any]]:
+    # Runs in the threadpool: the sync Session must not block the event loop.
+    with SessionLocal() as db:
+        service = SupportService(db)
+        thread = service.get_thread(thread_id)
+        ai_message = service.add_message(thread=thread, sender="ai", content=reply_text, role="assistant")
+        service.set_thread_status(thread, "open")
+        events = [_message_event(ai_message), _status_event(thread)]
+        db.commit()
+        return events
 
 
 @router.post("/threads", status_code=status.HTTP_201_CREATED)
 async def create_human_thread(
     payload: Dict[str, Any],
+    request: Request,
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     support_bus: SupportEventBus = Depends(get_support_bus),
@@ -167,7 +227,7 @@ async def create_human_thread(
     message = str(payload.get("message", "")).strip()
     if not message:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Message is required")
-    _ensure_rate_limit(user, "human")
+    _ensure_rate_limit(request, user, "human")
     service = SupportService(db)
     thread = service.create_thread(user=user, source="human")
     attachments = _normalize_attachments(payload.get("attachments"))
@@ -183,6 +243,7 @@ async def create_human_thread(
 async def post_thread_message(
     thread_id: UUID,
     payload: Dict[str, Any],
+    request: Request,
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     support_bus: SupportEventBus = Depends(get_support_bus),
@@ -190,7 +251,7 @@ async def post_thread_message(
     message = str(payload.get("message", "")).strip()
     if not message:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Message is required")
-    _ensure_rate_limit(user, "human")
+    _ensure_rate_limit(request, user, "human")
     service = SupportService(db)
     thread = service.get_thread_for_user(thread_id, user.id)
     if thread.source != "human":
@@ -215,24 +276,24 @@ async def stream_thread_events(
 ) -> StreamingResponse:
     service = SupportService(db)
     thread = service.get_thread_for_user(thread_id, user.id)
-    messages = service.thread_messages(thread)
-    initial_payload = _thread_payload(thread, messages)
-
-    queue = await support_bus.subscribe(thread.id)
+    # Subscribe before reading the snapshot: the bus keeps no history, so a
+    # reply committed before this point is in the snapshot and one published
+    # after it is buffered. The client de-duplicates messages by id.
+    subscriber = await support_bus.subscribe(thread.id)
+    try:
+        messages = service.thread_messages(thread)
+        initial_payload = _thread_payload(thread, messages)
+    except Exception:
+        await support_bus.unsubscribe(thread.id, subscriber)
+        raise
 
     async def event_generator():
         try:
-            yield _format_sse("thread.snapshot", initial_payload)
+            yield encode_sse("thread.snapshot", initial_payload)
             while True:
-                try:
-                    item = await asyncio.wait_for(queue.get(), timeout=25)
-                except asyncio.TimeoutError:
-                    yield ": ping\n\n"
-                    continue
-                event_type = item.get("event", "message")
-                data = item.get("data", {})
-                yield _format_sse(event_type, data)
+                frames = await subscriber.drain(wait_seconds=25)
+                yield b"".join(frames) if frames else _SSE_PING
         finally:
-            await support_bus.unsubscribe(thread.id, queue)
+            await support_bus.unsubscribe(thread.id, subscriber)
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
@@ -1,14 +1,15 @@
 from __future__ import annotations
 
 import asyncio
-import json
-from datetime import datetime, timedelta
+from datetime import timedelta
 from typing import Any, Dict, List
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.responses import JSONResponse, StreamingResponse
 
+import orjson
+
 from app.deps import (
     get_current_user,
     get_db,
@@ -420,21 +421,16 @@ async def stream_session_events(
                     event = await asyncio.wait_for(queue.get(), timeout=15)
                     yield _format_sse(event)
                 except asyncio.TimeoutError:
-                    yield ": ping\n\n"
+                    yield b": ping\n\n"
         finally:
             await event_bus.unsubscribe(session.id, queue)
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 
-def _format_sse(event: Dict[str, Any]) -> str:
+def _format_sse(event: Dict[str, Any]) -> bytes:
+    # orjson encodes datetimes/UUIDs natively and returns bytes, which
+    # StreamingResponse sends without re-encoding.
     event_type = event.get("event", "message")
     data = event.get("data", {})
-    payload = json.dumps(data, default=_json_default)
-    return f"event: {event_type}\ndata: {payload}\n\n"
-
-
-def _json_default(value: Any) -> Any:
-    if isinstance(value, datetime):
-        return value.isoformat()
-    return value
+    return f"event: {event_type}\ndata: ".encode() + orjson.dumps(data) + b"\n\n"
@@ -1,26 +1,71 @@
 ﻿from __future__ import annotations
 
-import json
+import asyncio
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
 from typing import Any, Dict
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 
+import orjson
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
-from sqlalchemy import select
 
 from app.deps import get_db, get_event_bus
 from app.models import AdminToken, User, VpsSession, Worker
-from app.security.crypto import decrypt_secret, verify_worker_signature
+from app.security.crypto import cached_secret, cached_signing_key, verify_worker_signature
 from app.services.event_bus import SessionEventBus
 from app.services.wallet import WalletService
+from app.utils import read_cached_body
 
 callbacks_router = APIRouter(prefix="/workers/callback", tags=["worker-callbacks"])
 workers_router = APIRouter(prefix="/workers", tags=["workers"])
 
 CLOCK_SKEW_SECONDS = 300
+# hashlib releases the GIL on large inputs; below this size the thread hop
+# costs more than hashing inline on the event loop.
+OFFLOAD_VERIFY_BYTES = 64 * 1024
+
+# Pre-encoded acknowledgement; a fresh Response is still built per request so
+# middleware header mutations never leak between callbacks.
+_OK_BODY = b'{"ok":true}'
+
+# Signed callbacks already applied, keyed on the verified worker id and the
+# request signature. Workers retry on network errors; a retry carries the same
+# signature and, once verified, is acknowledged without applying it again.
+# Entries live as long as a signature can pass the clock-skew check.
+REPLAY_TTL_SECONDS = CLOCK_SKEW_SECONDS
+REPLAY_CACHE_SIZE = 10_000
+_seen: "OrderedDict[tuple[UUID, str], float]" = OrderedDict()
+
+
+def _ok_response() -> Response:
+    return Response(_OK_BODY, media_type="application/json")
+
+
+def _replay_key(request: Request, worker: Worker) -> tuple[UUID, str]:
+    # Only called after _verify_request, which requires the signature header.
+    return worker.id, request.headers["X-Signature"]
+
+
+def _already_applied(key: tuple[UUID, str]) -> bool:
+    seen_at = _seen.get(key)
+    if seen_at is None:
+        return False
+    if time.monotonic() - seen_at > REPLAY_TTL_SECONDS:
+        _seen.pop(key, None)
+        return False
+    return True
+
+
+def _mark_applied(key: tuple[UUID, str]) -> None:
+    _seen[key] = time.monotonic()
+    _seen.move_to_end(key)
+    while len(_seen) > REPLAY_CACHE_SIZE:
+        _seen.popitem(last=False)
 
 
 def _parse_timestamp(raw: str) -> float:
@@ -49,14 +94,19 @@ async def worker_register(
     token = db.get(AdminToken, token_uuid)
     if not token or token.revoked_at:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token unavailable")
-    secret = decrypt_secret(token.token_ciphertext)
+    # Going through the cache warms it for the worker's signed callbacks.
+    secret = cached_secret(token.id, token.token_ciphertext)
     if secret != admin_token_plain:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token mismatch")
     normalized_url = str(base_url).rstrip('/')
-    existing_stmt = select(Worker).where(Worker.token_id == token_uuid, Worker.base_url == normalized_url)
-    existing = db.scalars(existing_stmt).first()
-    if existing:
-        worker = existing
+    existing_stmt = (
+        select(Worker.id)
+        .where(Worker.token_id == token_uuid, Worker.base_url == normalized_url)
+        .limit(1)
+    )
+    existing_id = db.scalar(existing_stmt)
+    if existing_id:
+        worker = db.get(Worker, existing_id)
         if name:
             worker.name = name
         worker.base_url = normalized_url
@@ -66,11 +116,10 @@ async def worker_register(
         worker = Worker(name=name, base_url=normalized_url, token_id=token_uuid, status="idle")
         db.add(worker)
     db.commit()
-    db.refresh(worker)
     return JSONResponse({"worker_id": str(worker.id)})
 
 
-async def _verify_request(request: Request, db: Session) -> tuple[Worker, bytes]:
+async def _verify_request(request: Request, db: Session) -> tuple[Worker, bytes, datetime]:
     worker_id_header = request.headers.get("X-Worker-Id")
     timestamp_header = request.headers.get("X-Timestamp")
     signature_header = request.headers.get("X-Signature")
@@ -80,21 +129,47 @@ async def _verify_request(request: Request, db: Session) -> tuple[Worker, bytes]
         worker_uuid = UUID(worker_id_header)
     except ValueError as exc:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid worker id") from exc
-    worker = db.get(Worker, worker_uuid)
-    if not worker or not worker.token_id:
+    # Reject stale or malformed timestamps before touching the database or
+    # decrypting the worker secret.
+    timestamp_value = _parse_timestamp(timestamp_header)
+    now = datetime.now(timezone.utc)
+    if abs(now.timestamp() - timestamp_value) > CLOCK_SKEW_SECONDS:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Clock skew too large")
+    # Outer join keeps the distinct "unknown" vs "revoked" errors while
+    # fetching the worker and its token in a single round-trip.
+    row = (
+        db.execute(
+            select(Worker, AdminToken)
+            .outerjoin(AdminToken, Worker.token_id == AdminToken.id)
+            .where(Worker.id == worker_uuid)
+        )
+    ).first()
+    if row is None or not row[0].token_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unknown worker")
-    token = db.get(AdminToken, worker.token_id)
+    worker, token = row
     if not token or token.revoked_at:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Worker token revoked")
-    body = await request.body()
-    timestamp_value = _parse_timestamp(timestamp_header)
-    now = datetime.now(timezone.utc).timestamp()
-    if abs(now - timestamp_value) > CLOCK_SKEW_SECONDS:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Clock skew too large")
-    secret = decrypt_secret(token.token_ciphertext)
-    if not verify_worker_signature(secret, body, timestamp_header, signature_header):
+    body = await read_cached_body(request)
+    signing_key = cached_signing_key(token.id, token.token_ciphertext)
+    if len(body) >= OFFLOAD_VERIFY_BYTES:
+        valid = await asyncio.to_thread(
+            verify_worker_signature, signing_key, body, timestamp_header, signature_header
+        )
+    else:
+        valid = verify_worker_signature(signing_key, body, timestamp_header, signature_header)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid signature")
-    return worker, body
+    return worker, body, now
+
+
+def _parse_payload(body: bytes) -> Dict[str, Any]:
+    try:
+        payload = orjson.loads(body)
+    except orjson.JSONDecodeError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON body") from exc
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON body")
+    return payload
 
 
 def _load_session(db: Session, session_id: UUID) -> VpsSession:
@@ -108,18 +183,21 @@ def _load_session(db: Session, session_id: UUID) -> VpsSession:
 async def worker_status(
     request: Request,
     db: Session = Depends(get_db),
-) -> JSONResponse:
-    worker, body = await _verify_request(request, db)
-    payload = json.loads(body.decode("utf-8"))
+) -> Response:
+    worker, body, now = await _verify_request(request, db)
+    replay_key = _replay_key(request, worker)
+    if _already_applied(replay_key):
+        return _ok_response()
+    payload = _parse_payload(body)
     current_jobs = int(payload.get("current_jobs", worker.current_jobs or 0))
     worker.current_jobs = current_jobs
     worker.last_net_mbps = payload.get("net_mbps")
     worker.last_req_rate = payload.get("req_rate")
-    worker.last_heartbeat = datetime.now(timezone.utc)
+    worker.last_heartbeat = now
     worker.status = "busy" if current_jobs > 0 else "idle"
-    db.add(worker)
     db.commit()
-    return JSONResponse({"ok": True})
+    _mark_applied(replay_key)
+    return _ok_response()
 
 
 @callbacks_router.post("/checklist")
@@ -127,27 +205,36 @@ async def worker_checklist(
     request: Request,
     db: Session = Depends(get_db),
     event_bus: SessionEventBus = Depends(get_event_bus),
-) -> JSONResponse:
-    worker, body = await _verify_request(request, db)
-    payload = json.loads(body.decode("utf-8"))
+) -> Response:
+    worker, body, now = await _verify_request(request, db)
+    replay_key = _replay_key(request, worker)
+    if _already_applied(replay_key):
+        return _ok_response()
+    payload = _parse_payload(body)
     session_id = payload.get("session_id")
     if not session_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing session_id")
     session_uuid = UUID(str(session_id))
-    session = _load_session(db, session_uuid)
     items = payload.get("items") or []
-    session.checklist = items
-    session.updated_at = datetime.now(timezone.utc)
-    db.add(session)
+    result = db.execute(
+        update(VpsSession)
+        .where(VpsSession.id == session_uuid)
+        .values(checklist=items, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if not result.rowcount:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
     db.commit()
     await event_bus.publish(
-        session.id,
+        session_uuid,
         {
             "event": "checklist.update",
             "data": {"items": items},
         },
     )
-    return JSONResponse({"ok": True})
+    _mark_applied(replay_key)
+    return _ok_response()
 
 
 @callbacks_router.post("/result")
@@ -155,9 +242,12 @@ async def worker_result(
     request: Request,
     db: Session = Depends(get_db),
     event_bus: SessionEventBus = Depends(get_event_bus),
-) -> JSONResponse:
-    worker, body = await _verify_request(request, db)
-    payload = json.loads(body.decode("utf-8"))
+) -> Response:
+    worker, body, now = await _verify_request(request, db)
+    replay_key = _replay_key(request, worker)
+    if _already_applied(replay_key):
+        return _ok_response()
+    payload = _parse_payload(body)
     session_id = payload.get("session_id")
     if not session_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing session_id")
@@ -165,8 +255,6 @@ async def worker_result(
     session = _load_session(db, session_uuid)
 
     status_value = payload.get("status")
-    now = datetime.now(timezone.utc)
-    user: User | None = db.get(User, session.user_id) if session.user_id else None
 
     if status_value == "ready":
         session.status = "ready"
@@ -177,9 +265,13 @@ async def worker_result(
         session.log_url = payload.get("log_url")
         session.updated_at = now
     elif status_value == "failed":
+        # Refund only on the transition so a retried callback cannot pay twice;
+        # the refund commits together with the status change.
+        already_failed = session.status == "failed"
         session.status = "failed"
         session.updated_at = now
-        if user and session.product:
+        user = db.get(User, session.user_id) if session.user_id else None
+        if not already_failed and user and session.product:
             WalletService(db).adjust_balance(
                 user,
                 session.product.price_coins,
@@ -194,17 +286,14 @@ async def worker_result(
         worker.current_jobs = max(worker.current_jobs - 1, 0)
     worker.status = "busy" if worker.current_jobs else "idle"
     worker.last_heartbeat = now
-    db.add(worker)
-    db.add(session)
     db.commit()
 
-    await event_bus.publish(
-        session.id,
+    events: list[Dict[str, Any]] = [
         {
             "event": "status.update",
             "data": {"status": session.status},
-        },
-    )
+        }
+    ]
     if session.status == "ready":
         ready_payload = {
             "rdp_host": session.rdp_host,
@@ -213,23 +302,18 @@ async def worker_result(
             "rdp_password": session.rdp_password,
             "log_url": session.log_url,
         }
-        await event_bus.publish(
-            session.id,
-            {
-                "event": "ready",
-                "data": ready_payload,
-            },
-        )
+        events.append({"event": "ready", "data": ready_payload})
     elif session.status == "failed":
-        await event_bus.publish(
-            session.id,
+        events.append(
             {
                 "event": "failed",
                 "data": {"message": payload.get("message", "Worker reported failure")},
-            },
+            }
         )
+    await event_bus.publish_many(session.id, events)
 
-    return JSONResponse({"ok": True})
+    _mark_applied(replay_key)
+    return _ok_response()
 
 
 __all__ = ['workers_router', 'callbacks_router']
@@ -1,4 +1,5 @@
 ﻿from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
 
 from .settings import get_settings
@@ -10,5 +11,19 @@ class Base(DeclarativeBase):
 
 settings = get_settings()
 
-engine = create_engine(settings.database_url, future=True, pool_pre_ping=True)
+
+def _pool_options() -> dict[str, object]:
+    # SQLite (used in tests) relies on its own pool classes without sizing knobs.
+    if make_url(settings.database_url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_use_lifo": True,
+    }
+
+
+engine = create_engine(settings.database_url, future=True, pool_pre_ping=True, **_pool_options())
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
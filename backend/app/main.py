@@ -1,15 +1,17 @@
 from __future__ import annotations
 
+import hashlib
 import logging
+import uuid
 from pathlib import Path
 from typing import Final
 
 from alembic import command
 from alembic.config import Config
 from fastapi import Depends, FastAPI, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse
 from fastapi.exception_handlers import http_exception_handler, request_validation_exception_handler
 from fastapi.exceptions import RequestValidationError
 from sqlalchemy import func, select, text
@@ -23,8 +25,15 @@ except ImportError:  # pragma: no cover - optional dependency
     def generate_latest():
         return b""
 
+try:  # pragma: no cover - optional dependency
+    from pyinstrument import Profiler
+except ImportError:  # pragma: no cover
+    Profiler = None
+
 from . import utils
 from .admin import init_admin
+from .admin.deps import user_has_permission
+from .db import SessionLocal
 from .auth import DiscordOAuthClient
 from .deps import get_current_user, get_db
 from .models import Asset, User
@@ -48,6 +57,7 @@ from app.services.kyaro import KyaroAssistant
 from app.services.wallet import WalletService
 from app.services.worker_client import WorkerClient
 from app.admin.models import Role, UserRole
+from app.security.crypto import hashlib_uses_openssl
 from app.admin.services import assets as asset_service
 
 settings = get_settings()
@@ -131,6 +141,44 @@ async def ensure_cors_headers(request: Request, call_next):
     return _apply_cors_headers(request, response)
 
 
+_PROFILE_PERMISSION = "sys:status:read"
+
+
+def _can_profile(request: Request) -> bool:
+    token = request.cookies.get(settings.session_cookie_name)
+    if not token:
+        return False
+    try:
+        payload = utils.verify_session(settings.secret_key, token)
+        user_id = uuid.UUID(str(payload.get("user_id")))
+    except Exception:
+        return False
+    with SessionLocal() as db:
+        return user_has_permission(db, user_id, _PROFILE_PERMISSION)
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """Render a pyinstrument report instead of the response for ``?profile=1``.
+
+    Only available when pyinstrument is installed and the caller holds the
+    system status permission, so it is safe to leave enabled in production.
+    """
+    if (
+        Profiler is None
+        or request.query_params.get("profile") != "1"
+        or not await run_in_threadpool(_can_profile, request)
+    ):
+        return await call_next(request)
+    profiler = Profiler(async_mode="enabled")
+    profiler.start()
+    try:
+        await call_next(request)
+    finally:
+        profiler.stop()
+    return HTMLResponse(profiler.output_html())
+
+
 def _preflight_headers(request: Request) -> tuple[dict[str, str], bool]:
     allowed_origins = settings.allowed_origins_list
     origin = request.headers.get("origin")
@@ -178,7 +226,10 @@ async def _handle_exception_with_cors(request: Request, exc: Exception) -> Respo
 
 
 oauth_client = DiscordOAuthClient(settings=settings)
-templates = Jinja2Templates(directory=str(Path(__file__).resolve().parent / "templates"))
+TEMPLATES_DIR = Path(__file__).resolve().parent / "templates"
+# index.html has no template variables, so it is read once and served as-is.
+_INDEX_HTML: Final[bytes] = (TEMPLATES_DIR / "index.html").read_bytes()
+_INDEX_ETAG: Final[str] = f'"{hashlib.sha256(_INDEX_HTML).hexdigest()[:16]}"'
 BASE_DIR = Path(__file__).resolve().parent.parent
 ASSETS_DIR = BASE_DIR / "assets"
 ASSETS_DIR.mkdir(parents=True, exist_ok=True)
@@ -227,6 +278,8 @@ def _init_redis():
 
 @app.on_event("startup")
 def on_startup() -> None:
+    if not hashlib_uses_openssl():
+        logger.warning("hashlib is not backed by OpenSSL; worker/SSV HMAC checks will be slow.")
     run_db_migrations()
     init_admin(app)
     app.state.event_bus = SessionEventBus()
@@ -257,7 +310,10 @@ async def cors_preflight(path: str, request: Request) -> Response:
 
 @app.get("/", include_in_schema=False)
 async def index(request: Request) -> Response:
-    return templates.TemplateResponse("index.html", {"request": request})
+    headers = {"ETag": _INDEX_ETAG, "Cache-Control": "public, max-age=300"}
+    if request.headers.get("if-none-match") == _INDEX_ETAG:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return HTMLResponse(content=_INDEX_HTML, headers=headers)
 
 
 @app.get("/health", response_model=HealthStatus)
@@ -514,9 +570,7 @@ async def update_me(
         changed = True
 
     if changed:
-        db.add(current_user)
         db.commit()
-        db.refresh(current_user)
 
     return _build_user_profile(db, current_user)
 
@@ -169,7 +169,10 @@ class VpsProduct(Base):
     )
 
     sessions = relationship("VpsSession", back_populates="product", passive_deletes=True)
-    workers = relationship("Worker", secondary=vps_product_workers, back_populates="products")
+    # Loaded explicitly (selectinload) wherever it is read; lazy loads raise.
+    workers = relationship(
+        "Worker", secondary=vps_product_workers, back_populates="products", lazy="raise"
+    )
 
 
 class VpsSession(Base):
@@ -322,6 +325,7 @@ class AdReward(Base):
     __tablename__ = "ad_rewards"
     __table_args__ = (
         UniqueConstraint("event_id", name="uq_ad_rewards_event_id"),
+        UniqueConstraint("user_id", "nonce", name="uq_ad_rewards_user_nonce"),
         Index("ix_ad_rewards_user_id_created_at", "user_id", "created_at"),
         Index("ix_ad_rewards_nonce", "nonce"),
     )
@@ -382,6 +386,13 @@ class SupportThread(Base):
             name="ck_support_threads_status",
         ),
         Index("ix_support_threads_user_id", "user_id"),
+        Index(
+            "ix_support_threads_user_source_status",
+            "user_id",
+            "source",
+            "status",
+            "updated_at",
+        ),
     )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -434,6 +445,7 @@ class Setting(Base):
 
 class Announcement(Base):
     __tablename__ = "announcements"
+    __table_args__ = (Index("ix_announcements_created_at", "created_at"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     title = Column(String(200), nullable=False)
@@ -4,7 +4,8 @@ import base64
 import hashlib
 import hmac
 import os
-from functools import lru_cache
+from threading import Lock
+from uuid import UUID
 
 try:
     from cryptography.hazmat.primitives.ciphers.aead import AESGCM  # type: ignore[attr-defined]
@@ -29,9 +30,15 @@ except ImportError:  # pragma: no cover - optional dependency fallback
                 counter += 1
             return bytes(output[:length])
 
+        @staticmethod
+        def _xor(data: bytes, stream: bytes) -> bytes:
+            # Big-int XOR runs in C instead of a per-byte generator.
+            size = len(data)
+            value = int.from_bytes(data, "big") ^ int.from_bytes(stream, "big")
+            return value.to_bytes(size, "big")
+
         def encrypt(self, nonce: bytes, data: bytes, associated_data: bytes | None) -> bytes:
-            stream = self._expand(nonce, len(data))
-            ciphertext = bytes(a ^ b for a, b in zip(data, stream))
+            ciphertext = self._xor(data, self._expand(nonce, len(data)))
             mac = hmac.new(self._key, nonce + ciphertext + (associated_data or b""), hashlib.sha256).digest()
             return ciphertext + mac
 
@@ -42,8 +49,7 @@ except ImportError:  # pragma: no cover - optional dependency fallback
             expected = hmac.new(self._key, nonce + ciphertext + (associated_data or b""), hashlib.sha256).digest()
             if not hmac.compare_digest(tag, expected):
                 raise ValueError("authentication failed")
-            stream = self._expand(nonce, len(ciphertext))
-            return bytes(a ^ b for a, b in zip(ciphertext, stream))
+            return self._xor(ciphertext, self._expand(nonce, len(ciphertext)))
 
 from app.settings import get_settings
 
@@ -52,7 +58,6 @@ class EncryptionError(Exception):
     """Raised when encryption key configuration is invalid."""
 
 
-@lru_cache(maxsize=1)
 def _load_key() -> bytes:
     settings = get_settings()
     raw = settings.encryption_key.strip()
@@ -76,35 +81,114 @@ def _load_key() -> bytes:
     raise EncryptionError("ENCRYPTION_KEY must decode to 16, 24, or 32 bytes")
 
 
+_AESGCM_SINGLETON: AESGCM | None = None
+
+
+def _aesgcm() -> AESGCM:
+    # Built on first use rather than at import so modules can be imported
+    # before ENCRYPTION_KEY is configured; afterwards it is a plain global read.
+    global _AESGCM_SINGLETON
+    if _AESGCM_SINGLETON is None:
+        _AESGCM_SINGLETON = AESGCM(_load_key())
+    return _AESGCM_SINGLETON
+
+
 def encrypt_secret(plaintext: str) -> str:
-    key = _load_key()
-    aesgcm = AESGCM(key)
     nonce = os.urandom(12)
-    ciphertext = aesgcm.encrypt(nonce, plaintext.encode("utf-8"), None)
+    ciphertext = _aesgcm().encrypt(nonce, plaintext.encode("utf-8"), None)
     return base64.urlsafe_b64encode(nonce + ciphertext).decode("utf-8")
 
 
 def decrypt_secret(ciphertext_b64: str) -> str:
-    key = _load_key()
     data = base64.urlsafe_b64decode(ciphertext_b64.encode("utf-8"))
     nonce, ciphertext = data[:12], data[12:]
-    aesgcm = AESGCM(key)
-    plaintext = aesgcm.decrypt(nonce, ciphertext, None)
+    plaintext = _aesgcm().decrypt(nonce, ciphertext, None)
     return plaintext.decode("utf-8")
 
 
+_SECRET_CACHE_SIZE = 512
+# token id -> (ciphertext, plaintext, keyed HMAC). Everything derived from a
+# secret lives in its token's entry, so invalidate_secret drops all of it.
+_secret_cache: dict[UUID, tuple[str, str, "hmac.HMAC"]] = {}
+_secret_cache_lock = Lock()
+
+
+def _secret_entry(token_id: UUID, ciphertext_b64: str) -> tuple[str, str, "hmac.HMAC"]:
+    # Entries remember the ciphertext they were decrypted from, so a rotated
+    # token is never served a stale plaintext.
+    cached = _secret_cache.get(token_id)
+    if cached is not None and cached[0] == ciphertext_b64:
+        return cached
+    secret = decrypt_secret(ciphertext_b64)
+    entry = (ciphertext_b64, secret, _hmac_key(secret))
+    with _secret_cache_lock:
+        if len(_secret_cache) >= _SECRET_CACHE_SIZE:
+            _secret_cache.pop(next(iter(_secret_cache)), None)
+        _secret_cache[token_id] = entry
+    return entry
+
+
+def cached_secret(token_id: UUID, ciphertext_b64: str) -> str:
+    """Return the decrypted secret for ``token_id``, decrypting only on a miss."""
+    return _secret_entry(token_id, ciphertext_b64)[1]
+
+
+def cached_signing_key(token_id: UUID, ciphertext_b64: str) -> "hmac.HMAC":
+    """Return the token's keyed HMAC for verify_worker_signature; never update it."""
+    return _secret_entry(token_id, ciphertext_b64)[2]
+
+
+def invalidate_secret(token_id: UUID) -> None:
+    with _secret_cache_lock:
+        _secret_cache.pop(token_id, None)
+
+
 def mask_token(token: str) -> str:
     if len(token) <= 4:
         return token
     return f"{token[:4]}" + "•" * (len(token) - 4)
 
 
-def compute_worker_signature(secret: str, payload: bytes, timestamp: str) -> str:
-    message = payload + timestamp.encode("utf-8")
-    digest = hmac.new(secret.encode("utf-8"), message, hashlib.sha256).hexdigest()
-    return digest
+def hashlib_uses_openssl() -> bool:
+    """Whether SHA-256 is served by OpenSSL (and so by SHA-NI where present)."""
+    return getattr(hashlib.sha256, "__name__", "") == "openssl_sha256"
+
+
+def _hmac_key(secret: str) -> "hmac.HMAC":
+    return hmac.new(secret.encode("utf-8"), digestmod=hashlib.sha256)
+
 
+def _worker_mac(key: "str | hmac.HMAC", payload: bytes, timestamp: str) -> "hmac.HMAC":
+    # A cached signing key is copied, which skips the ipad/opad setup.
+    mac = key.copy() if isinstance(key, hmac.HMAC) else _hmac_key(key)
+    mac.update(payload)
+    mac.update(timestamp.encode("utf-8"))
+    return mac
 
-def verify_worker_signature(secret: str, payload: bytes, timestamp: str, signature: str) -> bool:
-    expected = compute_worker_signature(secret, payload, timestamp)
-    return hmac.compare_digest(expected, signature)
+
+def compute_worker_signature(secret: "str | hmac.HMAC", payload: bytes, timestamp: str) -> str:
+    return _worker_mac(secret, payload, timestamp).hexdigest()
+
+
+def verify_worker_signature(secret: "str | hmac.HMAC", payload: bytes, timestamp: str, signature: str) -> bool:
+    # Compare the raw 32-byte digests rather than formatting a hex string.
+    try:
+        provided = bytes.fromhex(signature)
+    except ValueError:
+        return False
+    return hmac.compare_digest(_worker_mac(secret, payload, timestamp).digest(), provided)
+
+
+__all__ = [
+    "AESGCM",
+    "EncryptionError",
+    "cached_secret",
+    "cached_signing_key",
+    "compute_worker_signature",
+    "decrypt_secret",
+    "encrypt_secret",
+    "invalidate_secret",
+    "hashlib_uses_openssl",
+    "mask_token",
+    "verify_worker_signature",
+]
@@ -6,17 +6,22 @@ import hmac
 import ipaddress
 import json
 import logging
-import secrets
+import os
 import time
+from collections import OrderedDict
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
 from threading import Lock
-from typing import Any, Dict, Optional, Tuple
-from uuid import UUID
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+from urllib.parse import ParseResult, parse_qsl, urlencode, urlparse, urlunparse
+from uuid import UUID, uuid4
 
-import httpx
+import orjson
 from fastapi import HTTPException, status
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
 from app.metrics import (
@@ -37,26 +42,131 @@ MONETAG_LOCK_PREFIX = "ads:monetag:lock"
 _ticket_cache: Dict[str, tuple[str, float]] = {}
 _monetag_local_locks: Dict[str, float] = {}
 _monetag_locks_guard = Lock()
+# AdsService is built per request; its limiters are shared per (prefix, Redis
+# client) so the in-memory fallback keeps state and its bucket table is
+# allocated once per process rather than on every request.
+_rate_limiters: Dict[Tuple[str, Any], RateLimiter] = {}
+_rate_limiters_guard = Lock()
+
+if TYPE_CHECKING:  # pragma: no cover
+    import httpx
 
 try:
     from redis import Redis  # type: ignore
 except ImportError:  # pragma: no cover - optional dependency
     Redis = None
 
-try:
-    from cryptography.hazmat.primitives import hashes
-    from cryptography.hazmat.primitives.asymmetric import padding
-    from cryptography.hazmat.primitives.serialization import load_pem_public_key
-except ImportError:  # pragma: no cover - optional dependency
-    hashes = padding = load_pem_public_key = None
-
 logger = logging.getLogger(__name__)
 
 NONCE_REDIS_PREFIX = "ads:nonce"
+# Nonce payloads are "uid\0device\0placement\0issued_at"; placements are
+# validated against the allow-list before issue, so none contain the separator.
+NONCE_FIELD_SEP = "\x00"
 EVENT_REDIS_PREFIX = "ads:event"
 FAIL_STAT_REDIS_PREFIX = "ads:ssv:fail"
 SUCCESS_STAT_REDIS_PREFIX = "ads:ssv:success"
 CAP_REDIS_KEY = "ads:cap:effective"
+TURNSTILE_VERIFY_URL = "https://challenges.cloudflare.com/turnstile/v0/siteverify"
+# Deletes an event claim only while it still holds this request's token.
+RELEASE_CLAIM_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+# Expired in-memory nonces dropped per issue(); bounded to keep issue O(1).
+STORE_SWEEP_BATCH = 32
+# The cap key lives 1800 s; an unchanged cap is rewritten only this often.
+CAP_REFRESH_SECONDS = 300
+# Prepare/SSV read the cap from an in-process copy at most this old.
+CAP_CACHE_SECONDS = 2.0
+
+
+# ADS_BLOCKED_IPS -> (network, netmask, version) integers, so the per-request
+# check is an AND/compare instead of re-parsing every network.
+_blocked_nets_cache: Dict[str, Tuple[Tuple[int, int, int], ...]] = {}
+
+
+def _blocked_network_masks(settings: Settings) -> Tuple[Tuple[int, int, int], ...]:
+    raw = settings.blocked_ips or ""
+    masks = _blocked_nets_cache.get(raw)
+    if masks is None:
+        masks = tuple(
+            (int(network.network_address), int(network.netmask), network.version)
+            for network in settings.blocked_ip_networks
+        )
+        _blocked_nets_cache[raw] = masks
+    return masks
+
+
+# (cap, monotonic time) of this process's last CAP_REDIS_KEY write.
+_last_cap_write: Optional[Tuple[int, float]] = None
+# (monotonic time, raw CAP_REDIS_KEY value) of the last read.
+_cap_read_cache: Optional[Tuple[float, Optional[str]]] = None
+
+_policy_sets_cache: Dict[Tuple[str, str], Tuple[frozenset[str], frozenset[str]]] = {}
+
+
+def _policy_sets(settings: Settings) -> Tuple[frozenset[str], frozenset[str]]:
+    """Blocked ASNs (lower-cased) and allowed placements as frozensets."""
+    raw = (settings.blocked_asn or "", settings.ads_allowed_placements or "")
+    sets = _policy_sets_cache.get(raw)
+    if sets is None:
+        sets = (
+            frozenset(item.lower() for item in settings.blocked_asn_list),
+            frozenset(settings.allowed_placements),
+        )
+        _policy_sets_cache[raw] = sets
+    return sets
+
+
+_urandom = os.urandom
+_b64encode = base64.urlsafe_b64encode
+
+
+def _digest_matches_hex(expected: bytes, provided_hex: str) -> bool:
+    """Constant-time check of a raw digest against a hex signature."""
+    if len(provided_hex) != len(expected) * 2:
+        return False
+    try:
+        provided = bytes.fromhex(provided_hex)
+    except ValueError:
+        return False
+    return hmac.compare_digest(expected, provided)
+
+
+NONCE_BYTES = 32
+NONCE_POOL_SIZE = 128
+# Random bytes are read for NONCE_POOL_SIZE nonces at a time so that issuing a
+# nonce does not cost a getrandom() syscall each time. Forked children start
+# with an empty pool so that no two processes hand out the same bytes.
+_nonce_pool = b""
+_nonce_pool_offset = 0
+_nonce_pool_lock = Lock()
+
+
+def _reset_nonce_pool() -> None:
+    global _nonce_pool, _nonce_pool_offset, _nonce_pool_lock
+    _nonce_pool = b""
+    _nonce_pool_offset = 0
+    _nonce_pool_lock = Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_nonce_pool)
+
+
+def _new_nonce() -> str:
+    # Same output as secrets.token_urlsafe(32) minus its wrapper layers.
+    global _nonce_pool, _nonce_pool_offset
+    with _nonce_pool_lock:
+        offset = _nonce_pool_offset
+        if offset + NONCE_BYTES > len(_nonce_pool):
+            _nonce_pool = _urandom(NONCE_BYTES * NONCE_POOL_SIZE)
+            offset = 0
+        raw = _nonce_pool[offset : offset + NONCE_BYTES]
+        _nonce_pool_offset = offset + NONCE_BYTES
+    return _b64encode(raw).rstrip(b"=").decode("ascii")
 
 
 class AdsNonceError(Exception):
@@ -80,51 +190,63 @@ class AdsNonceManager:
     ) -> None:
         self.ttl_seconds = ttl_seconds
         self._redis = redis_client if Redis is not None else None
-        self._store: Dict[str, Tuple[str, str, str, float]] = {}
+        # Memory fallback when Redis is unavailable. Entries are appended in
+        # expiry order, so expired ones are swept from the front on each
+        # issue/consume without a separate expiry heap. The sync ads routes run
+        # in a threadpool and share one manager, so every access to the store
+        # holds _store_lock.
+        self._store: "OrderedDict[str, Tuple[str, str, str, float]]" = OrderedDict()
+        self._store_lock = Lock()
 
     def issue(self, user_id: UUID, device_hash: str, placement: str) -> str:
-        nonce = secrets.token_urlsafe(32)
+        nonce = _new_nonce()
         issued_at = time.time()
-        payload = json.dumps(
-            {
-                "uid": str(user_id),
-                "device": device_hash,
-                "placement": placement,
-                "iat": issued_at,
-            }
-        )
+        payload = NONCE_FIELD_SEP.join((str(user_id), device_hash, placement, repr(issued_at)))
         if self._redis is not None:
             key = self._redis_key(nonce)
             try:
                 self._redis.setex(key, self.ttl_seconds, payload)
             except Exception:  # pragma: no cover - fallback in case redis unavailable
                 logger.warning("Failed to persist nonce in redis; falling back to memory store.")
-                self._store[nonce] = (str(user_id), device_hash, placement, issued_at + self.ttl_seconds)
             else:
                 return nonce
 
-        self._store[nonce] = (str(user_id), device_hash, placement, issued_at + self.ttl_seconds)
+        self._remember(nonce, (str(user_id), device_hash, placement, issued_at + self.ttl_seconds), issued_at)
         return nonce
 
+    def _remember(self, nonce: str, record: Tuple[str, str, str, float], now: float) -> None:
+        with self._store_lock:
+            self._store[nonce] = record
+            self._sweep(now)
+
+    def _sweep(self, now: float) -> None:
+        # Caller holds _store_lock.
+        for _ in range(STORE_SWEEP_BATCH):
+            oldest = next(iter(self._store.values()), None)
+            if oldest is None or oldest[3] > now:
+                break
+            self._store.popitem(last=False)
+
     def consume(self, user_id: UUID, nonce: str) -> NonceRecord:
-        payload: Optional[str] = None
+        payload: Optional[str | bytes] = None
         if self._redis is not None:
             try:
                 payload = self._redis.getdel(self._redis_key(nonce))
             except Exception:  # pragma: no cover - fallback if redis unavailable
                 payload = None
         if payload:
-            try:
-                raw = json.loads(payload)
-            except json.JSONDecodeError as exc:  # pragma: no cover - defensive
-                raise AdsNonceError("Corrupted nonce payload") from exc
-            return self._build_record(user_id, nonce, raw)
-
-        record = self._store.pop(nonce, None)
+            if isinstance(payload, bytes):
+                payload = payload.decode("utf-8")
+            return self._build_record(user_id, nonce, self._parse_payload(payload))
+
+        now = time.time()
+        with self._store_lock:
+            record = self._store.pop(nonce, None)
+            self._sweep(now)
         if not record:
             raise AdsNonceError("Unknown nonce")
         stored_user_id, device_hash, placement, expires_at = record
-        if expires_at < time.time():
+        if expires_at < now:
             raise AdsNonceError("Nonce expired")
         if stored_user_id != str(user_id):
             raise AdsNonceError("Nonce owner mismatch")
@@ -138,30 +260,59 @@ class AdsNonceManager:
     def _redis_key(self, nonce: str) -> str:
         return f"{NONCE_REDIS_PREFIX}:{nonce}"
 
-    def _build_record(self, user_id: UUID, nonce: str, raw: Dict[str, Any]) -> NonceRecord:
-        stored_uid = raw.get("uid")
+    @staticmethod
+    def _parse_payload(payload: str) -> Tuple[str, str, str, float]:
+        if payload.startswith("{"):
+            # Nonces issued before the delimited format; gone after one TTL.
+            try:
+                raw = orjson.loads(payload)
+            except orjson.JSONDecodeError as exc:  # pragma: no cover - defensive
+                raise AdsNonceError("Corrupted nonce payload") from exc
+            return (
+                str(raw.get("uid") or ""),
+                str(raw.get("device") or ""),
+                str(raw.get("placement") or ""),
+                float(raw.get("iat", time.time())),
+            )
+        parts = payload.split(NONCE_FIELD_SEP, 3)
+        if len(parts) != 4:
+            raise AdsNonceError("Corrupted nonce payload")
+        stored_uid, device_hash, placement, issued_at = parts
+        try:
+            return stored_uid, device_hash, placement, float(issued_at)
+        except ValueError as exc:
+            raise AdsNonceError("Corrupted nonce payload") from exc
+
+    def _build_record(self, user_id: UUID, nonce: str, raw: Tuple[str, str, str, float]) -> NonceRecord:
+        stored_uid, device_hash, placement, issued_at = raw
         if stored_uid != str(user_id):
             raise AdsNonceError("Nonce owner mismatch")
-        device_hash = str(raw.get("device") or "")
-        placement = str(raw.get("placement") or "")
-        issued_at = datetime.fromtimestamp(float(raw.get("iat", time.time())), tz=timezone.utc)
         return NonceRecord(
             user_id=user_id,
             device_hash=device_hash,
             placement=placement,
-            issued_at=issued_at,
+            issued_at=datetime.fromtimestamp(issued_at, tz=timezone.utc),
         )
 
 
 class SSVSignatureVerifier:
     def __init__(self, settings: Settings) -> None:
         self._secret = (settings.ssv_secret or "").strip() or None
+        self._secret_bytes = self._secret.encode("utf-8") if self._secret else None
         self._public_key = None
+        self._hashes = self._padding = None
         public_key_path = (settings.ssv_public_key_path or "").strip()
         if public_key_path:
-            if load_pem_public_key is None:
+            # Imported only when RSA verification is configured; HMAC-only
+            # deployments never load the cryptography bindings here.
+            try:
+                from cryptography.hazmat.primitives import hashes
+                from cryptography.hazmat.primitives.asymmetric import padding
+                from cryptography.hazmat.primitives.serialization import load_pem_public_key
+            except ImportError:  # pragma: no cover - optional dependency
                 logger.error("cryptography package missing; cannot load SSV public key %s", public_key_path)
             else:
+                self._hashes, self._padding = hashes, padding
                 try:
                     with open(public_key_path, "rb") as handle:
                         self._public_key = load_pem_public_key(handle.read())
@@ -185,22 +336,24 @@ class SSVSignatureVerifier:
         placement: str | None,
         signature: str,
     ) -> None:
-        payload_parts = [
-            f"eventId={event_id}",
-            f"uid={uid}",
-            f"nonce={nonce}",
-            f"amount={amount}",
-            f"duration={duration}",
+        # Built directly as bytes; utf-8 keeps parity with the provider for any
+        # non-ASCII placement or device values.
+        parts = [
+            b"eventId=", event_id.encode("utf-8"),
+            b"|uid=", uid.encode("utf-8"),
+            b"|nonce=", nonce.encode("utf-8"),
+            b"|amount=", str(amount).encode("ascii"),
+            b"|duration=", str(duration).encode("ascii"),
         ]
         if placement:
-            payload_parts.append(f"placement={placement}")
+            parts += (b"|placement=", placement.encode("utf-8"))
         if device_hash:
-            payload_parts.append(f"device={device_hash}")
-        payload = "|".join(payload_parts).encode("utf-8")
+            parts += (b"|device=", device_hash.encode("utf-8"))
+        payload = b"".join(parts)
 
-        if self._secret:
-            expected = hmac.new(self._secret.encode("utf-8"), payload, hashlib.sha256).hexdigest()
-            if not hmac.compare_digest(expected, signature):
+        if self._secret_bytes:
+            expected = hmac.digest(self._secret_bytes, payload, "sha256")
+            if not _digest_matches_hex(expected, signature):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Invalid signature",
@@ -218,8 +371,8 @@ class SSVSignatureVerifier:
             self._public_key.verify(
                 signature_bytes,
                 payload,
-                padding.PKCS1v15(),
-                hashes.SHA256(),
+                self._padding.PKCS1v15(),
+                self._hashes.SHA256(),
             )
         except Exception as exc:
             raise HTTPException(
@@ -246,8 +399,9 @@ class PrepareContext:
 
 @dataclass(slots=True)
 class LimitsSnapshot:
-    user_limits: Optional[UserLimit]
-    device_limits: Optional[UserLimit]
+    # UserLimit entities when locked for update, plain column rows otherwise.
+    user_limits: Optional[Any]
+    device_limits: Optional[Any]
 
     @property
     def last_reward_at(self) -> Optional[datetime]:
@@ -275,23 +429,17 @@ class AdsService:
         self.settings = settings or get_settings()
         self.redis = redis_client if Redis is not None else None
         self.signature_verifier = SSVSignatureVerifier(self.settings)
-        self.prepare_limiter = RateLimiter(
-            requests=20,
-            window_seconds=2,
-            redis_client=self.redis,
-            prefix="ads:prepare",
-        )
-        self.ssv_limiter = RateLimiter(
-            requests=5,
-            window_seconds=10,
-            redis_client=self.redis,
-            prefix="ads:ssv",
-        )
+        self._event_claims: Dict[str, str] = {}
+        self._blocked_nets = _blocked_network_masks(self.settings)
+        self._blocked_asn, self._allowed_placements = _policy_sets(self.settings)
+        signing_secret = self.settings.client_signing_secret
+        self._client_signing_secret_bytes = signing_secret.encode("utf-8") if signing_secret else None
+        self.prepare_limiter = _shared_rate_limiter("ads:prepare", 20, 2, self.redis)
+        self.ssv_limiter = _shared_rate_limiter("ads:ssv", 5, 10, self.redis)
 
     def prepare(self, user: User, ctx: PrepareContext) -> Dict[str, Any]:
         now = datetime.now(timezone.utc)
-        self.prepare_limiter.check(f"ip:{ctx.ip}")
-        self.prepare_limiter.check(f"user:{user.id}")
+        self.prepare_limiter.check_many((f"ip:{ctx.ip}", f"user:{user.id}"))
 
         self._enforce_route(ctx.referer_path)
         self._enforce_ip_policy(ctx.ip, ctx.asn)
@@ -304,7 +452,7 @@ class AdsService:
         limits = self._fetch_limits_snapshot(user.id, ctx.device_hash, now.date())
         self._ensure_not_on_cooldown(limits, now)
         self._ensure_cap_available(limits, ctx.device_hash)
-        if ctx.placement not in self.settings.allowed_placements:
+        if ctx.placement not in self._allowed_placements:
             rewarded_ads_prepare_total.labels(status="placement").inc()
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid placement")
 
@@ -425,8 +573,8 @@ class AdsService:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ticket expired")
         secret = (self.settings.monetag_ticket_secret or self.settings.secret_key or "").strip()
         payload = f"{user_id}|{nonce}|{timestamp}"
-        expected_digest = hmac.new(secret.encode("utf-8"), payload.encode("utf-8"), hashlib.sha256).hexdigest()
-        if digest != expected_digest:
+        expected_digest = hmac.digest(secret.encode("utf-8"), payload.encode("utf-8"), "sha256")
+        if not _digest_matches_hex(expected_digest, digest):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ticket invalid or expired")
         stored_device_hash = data.get("device_hash")
         if stored_device_hash and stored_device_hash != device_hash:
@@ -486,7 +634,7 @@ class AdsService:
             self._register_failure()
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid uid") from exc
 
-        user = self.db.get(User, user_id)
+        user, existing_reward_id = self._load_user_and_event(user_id, event_id)
         if not user:
             rewarded_ads_ssv_total.labels(status="invalid").inc()
             self._register_failure()
@@ -501,8 +649,7 @@ class AdsService:
             self._register_failure()
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Duration too short")
 
-        existing_reward = self._get_reward_by_event(event_id)
-        if existing_reward:
+        if existing_reward_id:
             balance = WalletService(self.db).get_balance(user).balance
             rewarded_ads_ssv_total.labels(status="duplicate").inc()
             return {"ok": True, "added": 0, "balance": balance, "duplicate": True}
@@ -560,7 +707,6 @@ class AdsService:
         try:
             self._ensure_cap_available(limits, device_fingerprint)
             self._ensure_not_on_cooldown(limits, now)
-            self._ensure_unique_nonce(user_id, nonce)
         except HTTPException:
             self._register_failure()
             self._release_event_claim(event_id)
@@ -568,46 +714,56 @@ class AdsService:
             raise
 
         wallet_service = WalletService(self.db)
-        reward = AdReward(
-            user_id=user_id,
-            network=network,
-            event_id=event_id,
-            nonce=nonce,
-            reward_amount=amount,
-            duration_sec=duration,
-            placement=placement or nonce_record.placement,
-            device_hash=device_fingerprint,
-            meta={
-                "ip": ip,
-                "device_hash": device_fingerprint,
-                "placement": placement or nonce_record.placement,
-            },
-        )
-
         try:
-            with self.db.begin():
-                self.db.add(reward)
-                self.db.flush()
-                self._increment_limits(limits, now)
-                balance_info = wallet_service.adjust_balance(
-                    user,
-                    amount,
-                    entry_type="ads.reward",
-                    ref_id=reward.id,
-                    meta={
-                        "event_id": event_id,
-                        "network": network,
-                        "placement": placement or nonce_record.placement,
-                    },
-                )
+            reward_id = self._insert_reward(
+                user_id=user_id,
+                network=network,
+                event_id=event_id,
+                nonce=nonce,
+                reward_amount=amount,
+                duration_sec=duration,
+                placement=placement or nonce_record.placement,
+                device_hash=device_fingerprint,
+                meta={
+                    "ip": ip,
+                    "device_hash": device_fingerprint,
+                    "placement": placement or nonce_record.placement,
+                },
+            )
+            self._increment_limits(limits, now)
+            balance_info = wallet_service.adjust_balance(
+                user,
+                amount,
+                entry_type="ads.reward",
+                ref_id=reward_id,
+                meta={
+                    "event_id": event_id,
+                    "network": network,
+                    "placement": placement or nonce_record.placement,
+                },
+            )
+            self.db.commit()
+        except HTTPException:
+            self.db.rollback()
+            self._register_failure()
+            self._release_event_claim(event_id)
+            rewarded_ads_ssv_total.labels(status="invalid").inc()
+            raise
         except Exception:
+            self.db.rollback()
             self._release_event_claim(event_id)
             rewarded_ads_ssv_total.labels(status="error").inc()
             self._register_failure()
             raise
 
-        self._persist_event_claim(event_id, reward.id)
-        self._record_success_metrics(amount, duration, network, placement or nonce_record.placement)
+        self._event_claims.pop(event_id, None)
+        self._record_success_metrics(
+            amount,
+            duration,
+            network,
+            placement or nonce_record.placement,
+            event_claim=(event_id, reward_id),
+        )
         rewarded_ads_ssv_total.labels(status="success").inc()
 
         return {"ok": True, "added": amount, "balance": balance_info.balance}
@@ -645,37 +801,35 @@ class AdsService:
         try:
             self._ensure_cap_available(limits, device_hash)
             self._ensure_not_on_cooldown(limits, now)
-            self._ensure_unique_nonce(user.id, nonce)
         except HTTPException:
             self._register_failure()
             raise
 
         wallet_service = WalletService(self.db)
         amount = self.settings.reward_amount
-        reward = AdReward(
-            user_id=user.id,
-            network="monetag",
-            event_id=nonce,
-            nonce=nonce,
-            reward_amount=amount,
-            duration_sec=duration_sec,
-            placement=ticket_data.get("placement"),
-            device_hash=device_hash,
-            meta={"ticket": ticket},
-        )
         try:
-            with self.db.begin():
-                self.db.add(reward)
-                self.db.flush()
-                self._increment_limits(limits, now)
-                balance_info = wallet_service.adjust_balance(
-                    user,
-                    amount,
-                    entry_type="ads.reward",
-                    ref_id=reward.id,
-                    meta={"network": "monetag", "nonce": nonce},
-                )
+            reward_id = self._insert_reward(
+                user_id=user.id,
+                network="monetag",
+                event_id=nonce,
+                nonce=nonce,
+                reward_amount=amount,
+                duration_sec=duration_sec,
+                placement=ticket_data.get("placement"),
+                device_hash=device_hash,
+                meta={"ticket": ticket},
+            )
+            self._increment_limits(limits, now)
+            balance_info = wallet_service.adjust_balance(
+                user,
+                amount,
+                entry_type="ads.reward",
+                ref_id=reward_id,
+                meta={"network": "monetag", "nonce": nonce},
+            )
+            self.db.commit()
         except Exception:
+            self.db.rollback()
             self._register_failure()
             raise
 
@@ -690,21 +844,24 @@ class AdsService:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rewarded ads not available here")
 
     def _enforce_ip_policy(self, ip: str, asn: Optional[str]) -> None:
-        blocked_asn = {item.lower() for item in self.settings.blocked_asn_list}
-        if asn and asn.lower() in blocked_asn:
+        if asn and asn.lower() in self._blocked_asn:
             rewarded_ads_prepare_total.labels(status="blocked").inc()
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Traffic blocked")
 
-        for network in self.settings.blocked_ip_networks:
-            try:
-                if ipaddress.ip_address(ip) in network:
-                    rewarded_ads_prepare_total.labels(status="blocked").inc()
-                    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Traffic blocked")
-            except ValueError:  # pragma: no cover - invalid IP
-                continue
+        if not self._blocked_nets:
+            return
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:  # pragma: no cover - invalid IP
+            return
+        address_int = int(address)
+        for network_int, mask_int, version in self._blocked_nets:
+            if version == address.version and address_int & mask_int == network_int:
+                rewarded_ads_prepare_total.labels(status="blocked").inc()
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Traffic blocked")
 
     def _verify_client_signature(self, *, user_id: UUID, ctx: PrepareContext, now: datetime) -> None:
-        if not self.settings.client_signing_secret:
+        if not self._client_signing_secret_bytes:
             return
         if not ctx.signature or not ctx.client_nonce or not ctx.timestamp:
             rewarded_ads_prepare_total.labels(status="bad-signature").inc()
@@ -722,12 +879,8 @@ class AdsService:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Signature timestamp too old")
 
         payload = f"{user_id}|{ctx.client_nonce}|{ctx.timestamp}|{ctx.placement}".encode("utf-8")
-        expected = hmac.new(
-            self.settings.client_signing_secret.encode("utf-8"),
-            payload,
-            hashlib.sha256,
-        ).hexdigest()
-        if not hmac.compare_digest(expected, ctx.signature):
+        expected = hmac.digest(self._client_signing_secret_bytes, payload, "sha256")
+        if not _digest_matches_hex(expected, ctx.signature):
             rewarded_ads_prepare_total.labels(status="bad-signature").inc()
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid client signature")
 
@@ -748,12 +901,13 @@ class AdsService:
             "remoteip": ctx.ip,
         }
         try:
-            response = httpx.post(
-                "https://challenges.cloudflare.com/turnstile/v0/siteverify",
-                data=payload,
-                timeout=5.0,
+            response = _get_turnstile_client().post(
+                TURNSTILE_VERIFY_URL,
+                content=orjson.dumps(payload),
+                headers={"content-type": "application/json"},
             )
             response.raise_for_status()
+            result = orjson.loads(response.content)
         except Exception as exc:
             rewarded_ads_prepare_total.labels(status="turnstile-error").inc()
             logger.exception("Failed to verify Turnstile token")
@@ -762,7 +916,6 @@ class AdsService:
                 detail="turnstile_verification_failed",
             ) from exc
 
-        result = response.json()
         success = bool(result.get("success"))
         if not success:
             rewarded_ads_prepare_total.labels(status="turnstile-rejected").inc()
@@ -787,51 +940,46 @@ class AdsService:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="turnstile_failed")
 
     def _fetch_limits_snapshot(self, user_id: UUID, device_hash: str, day: date) -> LimitsSnapshot:
+        # Prepare only reads the counters, so fetch plain rows with the columns
+        # the cooldown/cap checks use instead of hydrating UserLimit entities.
         stmt = (
-            select(UserLimit)
+            select(
+                UserLimit.device_hash,
+                UserLimit.rewards,
+                UserLimit.device_rewards,
+                UserLimit.last_reward_at,
+            )
             .where(UserLimit.user_id == user_id)
             .where(UserLimit.day == day)
             .where(UserLimit.device_hash.in_([self._user_limit_scope(), device_hash]))
         )
-        limits = {record.device_hash: record for record in self.db.execute(stmt).scalars()}
+        limits = {record.device_hash: record for record in self.db.execute(stmt)}
         return LimitsSnapshot(
             user_limits=limits.get(self._user_limit_scope()),
             device_limits=limits.get(device_hash),
         )
 
     def _lock_limits(self, user_id: UUID, device_hash: str, day: date) -> LimitsSnapshot:
-        stmt = (
-            select(UserLimit)
-            .where(UserLimit.user_id == user_id)
-            .where(UserLimit.day == day)
-            .where(UserLimit.device_hash.in_([self._user_limit_scope(), device_hash]))
-            .with_for_update()
+        # Create-if-missing and lock both scope rows in one statement: the
+        # no-op DO UPDATE takes the same row lock SELECT ... FOR UPDATE did and
+        # makes RETURNING include rows that already existed.
+        scopes = dict.fromkeys([self._user_limit_scope(), device_hash])
+        stmt = self._dialect_insert()(UserLimit).values(
+            [
+                {"user_id": user_id, "device_hash": scope, "day": day, "rewards": 0, "device_rewards": 0}
+                for scope in scopes
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "device_hash", "day"],
+            set_={"user_id": stmt.excluded.user_id},
+        ).returning(UserLimit)
+        rows = self.db.scalars(stmt, execution_options={"populate_existing": True}).all()
+        limits = {record.device_hash: record for record in rows}
+        return LimitsSnapshot(
+            user_limits=limits.get(self._user_limit_scope()),
+            device_limits=limits.get(device_hash),
         )
-        limits = {record.device_hash: record for record in self.db.execute(stmt).scalars()}
-
-        user_limits = limits.get(self._user_limit_scope())
-        if user_limits is None:
-            user_limits = UserLimit(
-                user_id=user_id,
-                device_hash=self._user_limit_scope(),
-                day=day,
-                rewards=0,
-                device_rewards=0,
-            )
-            self.db.add(user_limits)
-
-        device_limits = limits.get(device_hash)
-        if device_limits is None:
-            device_limits = UserLimit(
-                user_id=user_id,
-                device_hash=device_hash,
-                day=day,
-                rewards=0,
-                device_rewards=0,
-            )
-            self.db.add(device_limits)
-
-        return LimitsSnapshot(user_limits=user_limits, device_limits=device_limits)
 
     def _ensure_not_on_cooldown(self, limits: LimitsSnapshot, now: datetime) -> None:
         last_reward_at = limits.last_reward_at
@@ -859,48 +1007,52 @@ class AdsService:
             limits.device_limits.device_rewards = (limits.device_limits.device_rewards or 0) + 1
             limits.device_limits.last_reward_at = now
 
-    def _ensure_unique_nonce(self, user_id: UUID, nonce: str) -> None:
+    def _dialect_insert(self):
+        # Upserts (ON CONFLICT) are dialect constructs; SQLite backs the tests.
+        return sqlite_insert if self.db.get_bind().dialect.name == "sqlite" else pg_insert
+
+    def _insert_reward(self, **values: Any) -> UUID:
+        # (user_id, nonce) is unique, so the insert doubles as the replay check:
+        # a conflict returns no row instead of needing a SELECT beforehand.
         stmt = (
-            select(AdReward)
-            .where(AdReward.user_id == user_id)
-            .where(AdReward.nonce == nonce)
+            self._dialect_insert()(AdReward)
+            .values(**values)
+            .on_conflict_do_nothing(index_elements=["user_id", "nonce"])
+            .returning(AdReward.id)
         )
-        existing = self.db.execute(stmt).scalar_one_or_none()
-        if existing:
+        reward_id = self.db.execute(stmt).scalar_one_or_none()
+        if reward_id is None:
             rewarded_ads_ssv_total.labels(status="duplicate").inc()
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Nonce already consumed")
+        return reward_id
 
     def _claim_event(self, event_id: str) -> bool:
         if self.redis is None:
             return True
         key = f"{EVENT_REDIS_PREFIX}:{event_id}"
+        # A per-claim token (rather than a shared "processing" marker) lets the
+        # release only delete the claim this request actually holds.
+        token = uuid4().hex
         try:
-            return bool(self.redis.set(key, "processing", nx=True, ex=86400))
+            claimed = bool(self.redis.set(key, token, nx=True, ex=86400))
         except Exception:  # pragma: no cover - fallback
             return True
+        if claimed:
+            self._event_claims[event_id] = token
+        return claimed
 
     def _release_event_claim(self, event_id: str) -> None:
-        if self.redis is None:
-            return
-        key = f"{EVENT_REDIS_PREFIX}:{event_id}"
-        try:
-            self.redis.delete(key)
-        except Exception:  # pragma: no cover
-            pass
-
-    def _persist_event_claim(self, event_id: str, reward_id: UUID) -> None:
-        if self.redis is None:
+        token = self._event_claims.pop(event_id, None)
+        if self.redis is None or token is None:
             return
         key = f"{EVENT_REDIS_PREFIX}:{event_id}"
         try:
-            self.redis.set(key, str(reward_id), ex=86400)
+            self.redis.eval(RELEASE_CLAIM_SCRIPT, 1, key, token)
         except Exception:  # pragma: no cover
             pass
 
     def _build_ad_tag_url(self, user_id: UUID, nonce: str, placement: str, device_hash: str) -> str:
-        from urllib.parse import urlencode, urlparse, urlunparse, parse_qsl
-
-        base_url = self.settings.ad_tag_base.rstrip("?")
+        parsed, base_query = _parse_ad_tag_base(self.settings.ad_tag_base)
 
         cust_params = {
             "uid": str(user_id),
@@ -911,41 +1063,49 @@ class AdsService:
         if self.settings.price_floor is not None:
             cust_params["floor"] = str(self.settings.price_floor)
 
-        query_params = dict(parse_qsl(urlparse(base_url).query))
+        query_params = dict(base_query)
         query_params["cust_params"] = urlencode(cust_params)
         query_params["reward_amount"] = str(self.settings.reward_amount)
-        parsed = urlparse(base_url)
-        rebuilt = parsed._replace(query=urlencode(query_params))
-        return urlunparse(rebuilt)
+        return urlunparse(parsed._replace(query=urlencode(query_params)))
 
-    def _record_success_metrics(self, amount: int, duration: int, network: str, placement: str | None) -> None:
+    def _record_success_metrics(
+        self,
+        amount: int,
+        duration: int,
+        network: str,
+        placement: str | None,
+        *,
+        event_claim: Optional[Tuple[str, UUID]] = None,
+    ) -> None:
         rewarded_ads_reward_amount.labels(network=network, placement=placement or "unknown").inc(amount)
         rewarded_ads_duration_seconds.observe(duration)
-        self._register_stat(success=True)
+        self._register_stat(success=True, event_claim=event_claim)
 
     def _register_failure(self) -> None:
         self._register_stat(success=False)
 
-    def _register_stat(self, *, success: bool) -> None:
+    def _register_stat(self, *, success: bool, event_claim: Optional[Tuple[str, UUID]] = None) -> None:
         if self.redis is None:
             return
         key = SUCCESS_STAT_REDIS_PREFIX if success else FAIL_STAT_REDIS_PREFIX
         try:
-            count = self.redis.incr(key)
-            if count == 1:
-                self.redis.expire(key, 1800)
+            # One round-trip for the counter bump, its TTL and both totals;
+            # EXPIRE NX (Redis 7) only arms the TTL on the first increment.
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.incr(key)
+            pipe.expire(key, 1800, nx=True)
+            pipe.get(SUCCESS_STAT_REDIS_PREFIX)
+            pipe.get(FAIL_STAT_REDIS_PREFIX)
+            if event_claim is not None:
+                # Swap the claim token for the reward id in the same round-trip.
+                event_id, reward_id = event_claim
+                pipe.set(f"{EVENT_REDIS_PREFIX}:{event_id}", str(reward_id), ex=86400)
+            _, _, success_raw, fail_raw = pipe.execute()[:4]
         except Exception:  # pragma: no cover
             return
-        self._recompute_failure_ratio()
+        self._recompute_failure_ratio(int(success_raw or 0), int(fail_raw or 0))
 
-    def _recompute_failure_ratio(self) -> None:
-        if self.redis is None:
-            return
-        try:
-            success = int(self.redis.get(SUCCESS_STAT_REDIS_PREFIX) or 0)
-            fail = int(self.redis.get(FAIL_STAT_REDIS_PREFIX) or 0)
-        except Exception:  # pragma: no cover
-            return
+    def _recompute_failure_ratio(self, success: int, fail: int) -> None:
         total = success + fail
         ratio = (fail / total) if total else 0.0
         rewarded_ads_failure_ratio.set(ratio)
@@ -953,10 +1113,20 @@ class AdsService:
         cap = base_cap
         if ratio > self.settings.ssv_failure_threshold:
             cap = max(self.settings.adaptive_cap_floor, base_cap // 2)
+        global _last_cap_write, _cap_read_cache
+        now = time.monotonic()
+        if _last_cap_write is not None:
+            last_cap, written_at = _last_cap_write
+            # Unchanged cap: skip the SET until the key is due a TTL refresh.
+            if last_cap == cap and now - written_at < CAP_REFRESH_SECONDS:
+                return
         try:
             self.redis.set(CAP_REDIS_KEY, cap, ex=1800)
         except Exception:  # pragma: no cover
             pass
+        else:
+            _last_cap_write = (cap, now)
+            _cap_read_cache = (now, str(cap))
         rewarded_ads_daily_cap.set(cap)
 
     def _get_effective_daily_cap(self) -> int:
@@ -964,11 +1134,17 @@ class AdsService:
         if self.redis is None:
             rewarded_ads_daily_cap.set(base_cap)
             return base_cap
-        try:
-            value = self.redis.get(CAP_REDIS_KEY)
-        except Exception:  # pragma: no cover
-            rewarded_ads_daily_cap.set(base_cap)
-            return base_cap
+        global _cap_read_cache
+        now = time.monotonic()
+        if _cap_read_cache is not None and now - _cap_read_cache[0] < CAP_CACHE_SECONDS:
+            value = _cap_read_cache[1]
+        else:
+            try:
+                value = self.redis.get(CAP_REDIS_KEY)
+            except Exception:  # pragma: no cover
+                rewarded_ads_daily_cap.set(base_cap)
+                return base_cap
+            _cap_read_cache = (now, value)
         if value is None:
             rewarded_ads_daily_cap.set(base_cap)
             return base_cap
@@ -982,11 +1158,64 @@ class AdsService:
     def _user_limit_scope(self) -> str:
         return "__user__"
 
+    def _load_user_and_event(self, user_id: UUID, event_id: str) -> Tuple[Optional[User], Optional[UUID]]:
+        # One round-trip for the user and whether this SSV event was already paid.
+        stmt = (
+            select(User, AdReward.id)
+            .outerjoin(AdReward, AdReward.event_id == event_id)
+            .where(User.id == user_id)
+        )
+        row = self.db.execute(stmt).first()
+        if row is None:
+            return None, None
+        return row[0], row[1]
+
     def _get_reward_by_event(self, event_id: str) -> Optional[AdReward]:
         stmt = select(AdReward).where(AdReward.event_id == event_id)
         return self.db.execute(stmt).scalar_one_or_none()
 
 
+def _shared_rate_limiter(
+    prefix: str, requests: int, window_seconds: int, redis_client: Optional["Redis"]
+) -> RateLimiter:
+    key = (prefix, redis_client)
+    limiter = _rate_limiters.get(key)
+    if limiter is None:
+        with _rate_limiters_guard:
+            limiter = _rate_limiters.get(key)
+            if limiter is None:
+                limiter = _rate_limiters[key] = RateLimiter(
+                    requests=requests,
+                    window_seconds=window_seconds,
+                    redis_client=redis_client,
+                    prefix=prefix,
+                )
+    return limiter
+
+
+_turnstile_client: httpx.Client | None = None
+
+
+def _get_turnstile_client() -> httpx.Client:
+    # Shared across requests so siteverify calls reuse pooled keep-alive
+    # connections instead of a fresh TCP+TLS handshake per prepare.
+    global _turnstile_client
+    if _turnstile_client is None:
+        import httpx
+
+        _turnstile_client = httpx.Client(
+            timeout=5.0,
+            limits=httpx.Limits(max_keepalive_connections=32, keepalive_expiry=60.0),
+        )
+    return _turnstile_client
+
+
+@lru_cache(maxsize=8)
+def _parse_ad_tag_base(ad_tag_base: str) -> Tuple[ParseResult, Tuple[Tuple[str, str], ...]]:
+    parsed = urlparse(ad_tag_base.rstrip("?"))
+    return parsed, tuple(parse_qsl(parsed.query))
+
+
 def compute_device_hash(
     *,
     secret: str,
@@ -997,10 +1226,20 @@ def compute_device_hash(
     subnet = _ip_subnet(ip_address)
     hints = "|".join(f"{key}:{value}" for key, value in sorted(client_hints.items()))
     payload = f"{subnet}|{user_agent}|{hints}".encode("utf-8")
-    digest = hashlib.sha256(secret.encode("utf-8") + payload).hexdigest()
-    return digest
+    hasher = _device_hash_prefix(secret).copy()
+    hasher.update(payload)
+    return hasher.hexdigest()
+
+
+@lru_cache(maxsize=4)
+def _device_hash_prefix(secret: str) -> Any:
+    # hashlib is backed by OpenSSL, which already dispatches to the SHA
+    # extensions when the CPU has them; priming the secret once saves
+    # re-hashing it and re-concatenating buffers on every request.
+    return hashlib.sha256(secret.encode("utf-8"))
 
 
+@lru_cache(maxsize=8192)
 def _ip_subnet(ip_raw: str) -> str:
     try:
         ip_obj = ipaddress.ip_address(ip_raw)
@@ -1,8 +1,7 @@
 ﻿from __future__ import annotations
 
 import asyncio
-from collections import defaultdict
-from typing import Any, Dict, Set
+from typing import Any, Dict, FrozenSet, List
 from uuid import UUID
 
 
@@ -10,30 +9,44 @@ class SessionEventBus:
     """In-memory pub/sub used for checklist and status streaming."""
 
     def __init__(self) -> None:
-        self._subscribers: Dict[UUID, Set[asyncio.Queue]] = defaultdict(set)
+        # Each session maps to an immutable set that subscribe/unsubscribe
+        # replace wholesale, so publishers can read it without the lock.
+        self._subscribers: Dict[UUID, FrozenSet[asyncio.Queue]] = {}
         self._lock = asyncio.Lock()
 
     async def publish(self, session_id: UUID, event: Dict[str, Any]) -> None:
-        async with self._lock:
-            queues = list(self._subscribers.get(session_id, set()))
+        await self.publish_many(session_id, [event])
+
+    async def publish_many(self, session_id: UUID, events: List[Dict[str, Any]]) -> None:
+        """Deliver several events in order with a single subscriber lookup.
+
+        Every subscriber receives the same event objects, so consumers must
+        treat them as read-only and copy before mutating.
+        """
+        queues = self._subscribers.get(session_id)
         if not queues:
             return
         for queue in queues:
-            item = event.copy()
+            for event in events:
+                self._offer(queue, event)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, item: Dict[str, Any]) -> None:
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Drop oldest message to keep stream moving.
             try:
+                queue.get_nowait()
                 queue.put_nowait(item)
-            except asyncio.QueueFull:
-                # Drop oldest message to keep stream moving.
-                try:
-                    queue.get_nowait()
-                    queue.put_nowait(item)
-                except Exception:
-                    continue
+            except Exception:
+                return
 
     async def subscribe(self, session_id: UUID, *, max_queue_items: int = 100) -> asyncio.Queue:
         queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_items)
         async with self._lock:
-            self._subscribers[session_id].add(queue)
+            current = self._subscribers.get(session_id, frozenset())
+            self._subscribers[session_id] = current | {queue}
         return queue
 
     async def unsubscribe(self, session_id: UUID, queue: asyncio.Queue) -> None:
@@ -41,11 +54,11 @@ class SessionEventBus:
             subscribers = self._subscribers.get(session_id)
             if not subscribers:
                 return
-            subscribers.discard(queue)
-            if not subscribers:
+            remaining = subscribers - {queue}
+            if remaining:
+                self._subscribers[session_id] = remaining
+            else:
                 self._subscribers.pop(session_id, None)
-            while not queue.empty():
-                queue.get_nowait()
 
 
 __all__ = ["SessionEventBus"]
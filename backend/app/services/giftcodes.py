@@ -1,16 +1,47 @@
 from __future__ import annotations
 
+import time
 from datetime import datetime, timezone
-from typing import List
+from typing import Dict, List, NoReturn
 
 from fastapi import HTTPException, status
-from sqlalchemy import select
+from sqlalchemy import and_, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from uuid import UUID
 
 from app.models import GiftCode, GiftCodeRedemption, User
 from app.services.wallet import WalletService
 
+MISSING_CODE_CACHE_SECONDS = 5.0
+MISSING_CODE_CACHE_MAX_ENTRIES = 4096
+
+# Per-process cache of normalized codes confirmed absent, so guessing
+# attempts do not each reach the database. Admin writes only clear the
+# entry in the process that handled them; other workers keep answering
+# "not found" for a new code until the short TTL runs out.
+_missing_codes: Dict[str, float] = {}
+
+
+def _remember_missing(normalized_code: str) -> None:
+    if len(_missing_codes) >= MISSING_CODE_CACHE_MAX_ENTRIES:
+        _missing_codes.clear()
+    _missing_codes[normalized_code] = time.monotonic() + MISSING_CODE_CACHE_SECONDS
+
+
+def _is_known_missing(normalized_code: str) -> bool:
+    missing_until = _missing_codes.get(normalized_code)
+    if missing_until is None:
+        return False
+    if missing_until > time.monotonic():
+        return True
+    _missing_codes.pop(normalized_code, None)
+    return False
+
+
+def _forget_code(normalized_code: str) -> None:
+    _missing_codes.pop(normalized_code, None)
+
 
 class GiftCodeService:
     def __init__(self, db: Session) -> None:
@@ -62,6 +93,7 @@ class GiftCodeService:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="giftcode_total_invalid")
         normalized_code = self._normalize_code(code)
         self._ensure_unique_code(normalized_code)
+        _forget_code(normalized_code)
 
         gift_code = GiftCode(
             title=title.strip(),
@@ -90,6 +122,8 @@ class GiftCodeService:
             normalized = self._normalize_code(code)
             if normalized != gift_code.code:
                 self._ensure_unique_code(normalized, exclude_id=gift_code.id)
+                _forget_code(gift_code.code)
+                _forget_code(normalized)
                 gift_code.code = normalized
         if title is not None:
             gift_code.title = title.strip()
@@ -115,52 +149,101 @@ class GiftCodeService:
         return gift_code
 
     def delete_code(self, gift_code: GiftCode) -> None:
+        _forget_code(gift_code.code)
         self.db.delete(gift_code)
         self.db.commit()
 
-    def redeem_code(self, *, user: User, code: str) -> tuple[GiftCodeRedemption, GiftCode]:
-        normalized_code = self._normalize_code(code)
+    def _claim_use(self, normalized_code: str, user_id: UUID) -> GiftCode | None:
+        """Take one use of the code for ``user_id`` in a single UPDATE.
+
+        Returns None when the code is missing, inactive, exhausted or already
+        redeemed by the user; ``_raise_unavailable`` tells those apart.
+        """
+        already_redeemed = (
+            select(GiftCodeRedemption.id)
+            .where(GiftCodeRedemption.gift_code_id == GiftCode.id)
+            .where(GiftCodeRedemption.user_id == user_id)
+            .exists()
+        )
         stmt = (
-            select(GiftCode)
+            update(GiftCode)
             .where(GiftCode.code == normalized_code)
-            .with_for_update()
+            .where(GiftCode.is_active.is_(True))
+            .where(GiftCode.redeemed_count < GiftCode.total_uses)
+            .where(~already_redeemed)
+            .values(
+                redeemed_count=GiftCode.redeemed_count + 1,
+                updated_at=datetime.now(timezone.utc),
+            )
+            .returning(GiftCode)
         )
-        gift_code = self.db.execute(stmt).scalar_one_or_none()
-        if not gift_code or not gift_code.is_active:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="giftcode_not_found")
-        if gift_code.redeemed_count >= gift_code.total_uses:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="giftcode_out_of_stock")
-
-        redemption_stmt = (
-            select(GiftCodeRedemption)
-            .where(GiftCodeRedemption.gift_code_id == gift_code.id)
-            .where(GiftCodeRedemption.user_id == user.id)
-            .with_for_update()
+        return self.db.scalars(stmt, execution_options={"populate_existing": True}).one_or_none()
+
+    def _raise_unavailable(self, normalized_code: str, user_id: UUID) -> NoReturn:
+        stmt = (
+            select(
+                GiftCode.is_active,
+                GiftCode.redeemed_count,
+                GiftCode.total_uses,
+                GiftCodeRedemption.id.label("redemption_id"),
+            )
+            .outerjoin(
+                GiftCodeRedemption,
+                and_(
+                    GiftCodeRedemption.gift_code_id == GiftCode.id,
+                    GiftCodeRedemption.user_id == user_id,
+                ),
+            )
+            .where(GiftCode.code == normalized_code)
         )
-        existing = self.db.execute(redemption_stmt).scalar_one_or_none()
-        if existing:
+        row = self.db.execute(stmt).one_or_none()
+        if row is None:
+            _remember_missing(normalized_code)
+        if row is None or not row.is_active:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="giftcode_not_found")
+        if row.redemption_id is not None and row.redeemed_count < row.total_uses:
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="giftcode_already_redeemed")
+        # Exhausted, or changed concurrently since the UPDATE; either way the
+        # client may retry.
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="giftcode_out_of_stock")
 
-        self.wallet.adjust_balance(
-            user,
-            gift_code.reward_amount,
-            entry_type="giftcode.redeem",
-            ref_id=gift_code.id,
-            meta={"code": gift_code.code},
-        )
+    def redeem_code(self, *, user: User, code: str) -> tuple[GiftCodeRedemption, GiftCode]:
+        normalized_code = self._normalize_code(code)
+        if _is_known_missing(normalized_code):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="giftcode_not_found")
+        gift_code = self._claim_use(normalized_code, user.id)
+        if gift_code is None:
+            self._raise_unavailable(normalized_code, user.id)
 
         redemption = GiftCodeRedemption(
             gift_code_id=gift_code.id,
             user_id=user.id,
             reward_amount=gift_code.reward_amount,
+            redeemed_at=datetime.now(timezone.utc),
         )
-        gift_code.redeemed_count += 1
-        gift_code.updated_at = datetime.now(timezone.utc)
         self.db.add(redemption)
-        self.db.add(gift_code)
+        try:
+            self.db.flush()
+        except IntegrityError as exc:
+            # A concurrent redemption by the same user won the unique constraint.
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail="giftcode_already_redeemed"
+            ) from exc
+
+        self.wallet.adjust_balance(
+            user,
+            gift_code.reward_amount,
+            entry_type="giftcode.redeem",
+            ref_id=gift_code.id,
+            meta={"code": gift_code.code},
+        )
+        # Both rows are fully loaded (the code row came back from RETURNING),
+        # so detach them before committing instead of letting the commit
+        # expire them and re-selecting.
+        self.db.expunge(redemption)
+        self.db.expunge(gift_code)
         self.db.commit()
-        self.db.refresh(redemption)
-        self.db.refresh(gift_code)
         return redemption, gift_code
 
 
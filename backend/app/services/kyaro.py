@@ -1,6 +1,7 @@
 ﻿from __future__ import annotations
 
 import asyncio
+import re
 from typing import Iterable, Sequence
 
 from fastapi import HTTPException, status
@@ -9,11 +10,14 @@ from openai import AsyncOpenAI
 from app.models import SupportMessage
 from app.settings import get_settings
 
+_FORBIDDEN = re.compile(r"session|token", re.IGNORECASE).search
+_ASSISTANT_SENDERS = frozenset({"ai", "admin"})
+
+
 def _sanitize(text: str | None) -> str:
     if not text:
         return ""
-    lowered = text.lower()
-    if "session" in lowered or "token" in lowered:
+    if _FORBIDDEN(text):
         return "[chung toi chua ho tro hien thi tinh nang nay]"
     return text
 
@@ -25,6 +29,9 @@ class KyaroAssistant:
         self._settings = get_settings()
 
     async def _get_client(self) -> AsyncOpenAI:
+        client = self._client
+        if client is not None:
+            return client
         async with self._lock:
             if self._client is None:
                 base_url = self._settings.hface_gpt_base_url
@@ -37,9 +44,13 @@ class KyaroAssistant:
     async def generate_reply(self, *, system_prompt: str, history: Sequence[SupportMessage]) -> str:
         client = await self._get_client()
         messages = [{"role": "system", "content": system_prompt}]
-        for item in history:
-            role = item.role or ("assistant" if item.sender in {"ai", "admin"} else "user")
-            messages.append({"role": role, "content": _sanitize(item.content)})
+        messages.extend(
+            {
+                "role": item.role or ("assistant" if item.sender in _ASSISTANT_SENDERS else "user"),
+                "content": _sanitize(item.content),
+            }
+            for item in history
+        )
         try:
             response = await client.chat.completions.create(
                 model=self._settings.hface_gpt_model,
@@ -49,8 +60,9 @@ class KyaroAssistant:
             )
         except Exception as exc:
             raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Kyaro AI error") from exc
-        choice = response.choices[0]
-        content = choice.message.content or ""
+        if not response.choices:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Kyaro AI error")
+        content = response.choices[0].message.content or ""
         return _sanitize(content)
 
 
@@ -1,8 +1,9 @@
 ﻿from __future__ import annotations
 
+import os
 import time
-from collections import defaultdict, deque
-from typing import Deque, Dict, Optional
+from array import array
+from typing import Optional, Sequence
 
 try:
     from redis import Redis  # type: ignore
@@ -11,6 +12,25 @@ except ImportError:  # pragma: no cover - optional dependency
 
 from fastapi import HTTPException, status
 
+MEMORY_BUCKET_SLOTS = 4096  # power of two, used as a hash mask
+
+# Trim and count every key first and only record the hit when all keys are
+# under the limit, so rejected requests do not extend their own penalty.
+# KEYS: bucket keys; ARGV: window_start_ms, now_ms, requests, window_ms, member.
+SLIDING_WINDOW_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, 0, ARGV[1])
+    if redis.call('ZCARD', key) >= tonumber(ARGV[3]) then
+        return 1
+    end
+end
+for _, key in ipairs(KEYS) do
+    redis.call('ZADD', key, ARGV[2], ARGV[5])
+    redis.call('PEXPIRE', key, ARGV[4])
+end
+return 0
+"""
+
 
 class RateLimiter:
     def __init__(
@@ -23,45 +43,70 @@ class RateLimiter:
     ) -> None:
         self.requests = requests
         self.window_seconds = window_seconds
-        self._hits: Dict[str, Deque[float]] = defaultdict(deque)
+        # In-process fallback: a fixed table of token buckets stored as
+        # (tokens, last_refill) pairs and addressed by key hash. Keys that
+        # collide share a bucket, which only ever limits sooner, and memory
+        # stays bounded however many distinct keys are seen. Allocated on
+        # first use since limiters backed by Redis never need it; the table
+        # holds the limiter's state, so keep instances long-lived.
+        self._buckets: Optional[array] = None
         self._redis = redis_client if Redis is not None else None
         self._prefix = prefix
+        # Script objects run via EVALSHA and reload themselves on NOSCRIPT.
+        self._script = (
+            self._redis.register_script(SLIDING_WINDOW_SCRIPT)
+            if self._redis is not None
+            else None
+        )
 
     def check(self, key: str) -> None:
-        if self._redis is not None:
-            self._check_redis(key)
+        self.check_many((key,))
+
+    def check_many(self, keys: Sequence[str]) -> None:
+        """Count a hit against every key, raising 429 if any is over the limit.
+
+        With Redis all keys go through one script call, so N keys cost one
+        round-trip.
+        """
+        if self._script is not None:
+            self._check_redis(keys)
             return
-        self._check_memory(key)
+        for key in keys:
+            self._check_memory(key)
 
     def _check_memory(self, key: str) -> None:
-        now = time.time()
-        window_start = now - self.window_seconds
-        queue = self._hits[key]
-        while queue and queue[0] < window_start:
-            queue.popleft()
-        if len(queue) >= self.requests:
+        now = time.monotonic()
+        buckets = self._buckets
+        if buckets is None:
+            initial = [float(self.requests), 0.0] * MEMORY_BUCKET_SLOTS
+            buckets = self._buckets = array("d", initial)
+        index = (hash(key) & (MEMORY_BUCKET_SLOTS - 1)) * 2
+        refill = (now - buckets[index + 1]) * self.requests / self.window_seconds
+        tokens = min(float(self.requests), buckets[index] + refill)
+        buckets[index + 1] = now
+        if tokens < 1:
+            buckets[index] = tokens
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail="Rate limit exceeded. Please retry later.",
             )
-        queue.append(now)
+        buckets[index] = tokens - 1
 
-    def _check_redis(self, key: str) -> None:
-        assert self._redis is not None  # for type checkers
+    def _check_redis(self, keys: Sequence[str]) -> None:
+        assert self._script is not None  # for type checkers
         now_ms = int(time.time() * 1000)
-        window_start = now_ms - int(self.window_seconds * 1000)
-        redis_key = f"{self._prefix}:{key}"
+        window_ms = int(self.window_seconds * 1000)
+        member = f"{now_ms}:{os.urandom(4).hex()}"
         try:
-            pipeline = self._redis.pipeline()
-            pipeline.zadd(redis_key, {str(now_ms): now_ms})
-            pipeline.zremrangebyscore(redis_key, 0, window_start)
-            pipeline.zcard(redis_key)
-            pipeline.expire(redis_key, self.window_seconds)
-            _, _, count, _ = pipeline.execute()
+            limited = self._script(
+                keys=[f"{self._prefix}:{key}" for key in keys],
+                args=[now_ms - window_ms, now_ms, self.requests, window_ms, member],
+            )
         except Exception:  # pragma: no cover - failsafe fallback
-            self._check_memory(key)
+            for key in keys:
+                self._check_memory(key)
             return
-        if count > self.requests:
+        if limited:
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail="Rate limit exceeded. Please retry later.",
@@ -1,7 +1,8 @@
 ﻿from __future__ import annotations
 
+import time
 from datetime import datetime, timezone
-from typing import Any
+from typing import Any, Dict, Tuple
 
 from fastapi import HTTPException, status
 from sqlalchemy import select
@@ -11,7 +12,14 @@ from app.admin.audit import AuditContext, record_audit
 from app.models import Setting
 
 
+CACHE_TTL_SECONDS = 5.0
+
+
 class SettingsStore:
+    # Settings are read on public endpoints but change rarely, so values are
+    # cached per process for a few seconds (None marks a missing key).
+    _cache: Dict[str, Tuple[dict | None, float]] = {}
+
     def __init__(self, db: Session) -> None:
         self.db = db
 
@@ -20,12 +28,19 @@ class SettingsStore:
         return self.db.scalar(stmt)
 
     def get(self, key: str, default: dict | None = None) -> dict:
-        entry = self._get_setting(key)
-        if entry is None:
+        now = time.monotonic()
+        cached = self._cache.get(key)
+        if cached is not None and cached[1] > now:
+            value = cached[0]
+        else:
+            entry = self._get_setting(key)
+            value = dict(entry.value or {}) if entry is not None else None
+            self._cache[key] = (value, now + CACHE_TTL_SECONDS)
+        if value is None:
             if default is None:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Setting {key} not found")
             return default
-        return dict(entry.value or {})
+        return dict(value)
 
     def set(self, key: str, value: dict[str, Any], *, context: AuditContext) -> dict:
         entry = self._get_setting(key)
@@ -39,6 +54,7 @@ class SettingsStore:
             self.db.add(entry)
         self.db.commit()
         self.db.refresh(entry)
+        self._cache[key] = (dict(entry.value or {}), time.monotonic() + CACHE_TTL_SECONDS)
         record_audit(
             self.db,
             context=context,
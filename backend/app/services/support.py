@@ -45,10 +45,12 @@ class SupportService:
 
     @staticmethod
     def attachments_for_message(message: SupportMessage) -> list[dict]:
+        # add_message normalizes attachments before storing them, so the read
+        # path returns the stored list as-is.
         meta = message.meta or {}
         raw = meta.get("attachments")
         if isinstance(raw, list):
-            return SupportService.normalize_attachments(raw)
+            return raw
         return []
 
     @staticmethod
@@ -114,6 +116,7 @@ class SupportService:
             .where(SupportThread.source == source)
             .where(SupportThread.status.in_(["open", "pending"]))
             .order_by(SupportThread.updated_at.desc())
+            .limit(1)
         )
         existing = self.db.scalars(stmt).first()
         if existing:
@@ -1,50 +1,84 @@
 from __future__ import annotations
 
 import asyncio
-from collections import defaultdict
-from typing import Any, Dict, Set
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
 from uuid import UUID
 
+import orjson
+
+_SSE_PREFIXES = {
+    name: f"event: {name}\ndata: ".encode()
+    for name in ("message.created", "thread.status", "thread.snapshot")
+}
+
+
+def encode_sse(event: str, payload: Any) -> bytes:
+    """Encode one server-sent event frame."""
+    prefix = _SSE_PREFIXES.get(event) or f"event: {event}\ndata: ".encode()
+    return prefix + orjson.dumps(payload) + b"\n\n"
+
+
+class _Subscriber:
+    """Bounded frame buffer for one stream; the oldest frame is dropped when full."""
+
+    __slots__ = ("buf", "event")
+
+    def __init__(self, max_items: int) -> None:
+        self.buf: Deque[bytes] = deque(maxlen=max_items)
+        self.event = asyncio.Event()
+
+    def push(self, frame: bytes) -> None:
+        self.buf.append(frame)
+        self.event.set()
+
+    async def drain(self, wait_seconds: float) -> List[bytes]:
+        """Wait up to ``wait_seconds`` seconds and return every buffered frame."""
+        if not self.buf:
+            try:
+                await asyncio.wait_for(self.event.wait(), timeout=wait_seconds)
+            except asyncio.TimeoutError:
+                return []
+        frames = list(self.buf)
+        self.buf.clear()
+        self.event.clear()
+        return frames
+
 
 class SupportEventBus:
-    """In-memory pub/sub for support thread events."""
+    """In-memory pub/sub for support thread events.
+
+    Subscriber tuples are replaced rather than mutated, and every call runs on
+    the event loop without awaiting in between, so no lock is needed. Events
+    are encoded to an SSE frame once per publish and appended to each
+    subscriber's ring buffer, which evicts the oldest frame for slow readers.
+    """
 
     def __init__(self) -> None:
-        self._subscribers: Dict[UUID, Set[asyncio.Queue]] = defaultdict(set)
-        self._lock = asyncio.Lock()
+        self._subscribers: Dict[UUID, Tuple[_Subscriber, ...]] = {}
 
     async def publish(self, thread_id: UUID, event: Dict[str, Any]) -> None:
-        async with self._lock:
-            queues = list(self._subscribers.get(thread_id, set()))
-        if not queues:
+        subscribers = self._subscribers.get(thread_id)
+        if not subscribers:
             return
-        for queue in queues:
-            payload = event.copy()
-            try:
-                queue.put_nowait(payload)
-            except asyncio.QueueFull:
-                try:
-                    queue.get_nowait()
-                    queue.put_nowait(payload)
-                except Exception:
-                    continue
-
-    async def subscribe(self, thread_id: UUID, *, max_queue_items: int = 100) -> asyncio.Queue:
-        queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_items)
-        async with self._lock:
-            self._subscribers[thread_id].add(queue)
-        return queue
-
-    async def unsubscribe(self, thread_id: UUID, queue: asyncio.Queue) -> None:
-        async with self._lock:
-            subscribers = self._subscribers.get(thread_id)
-            if not subscribers:
-                return
-            subscribers.discard(queue)
-            if not subscribers:
-                self._subscribers.pop(thread_id, None)
-            while not queue.empty():
-                queue.get_nowait()
-
-
-__all__ = ["SupportEventBus"]
+        frame = encode_sse(event.get("event", "message"), event.get("data", {}))
+        for subscriber in subscribers:
+            subscriber.push(frame)
+
+    async def subscribe(self, thread_id: UUID, *, max_queue_items: int = 100) -> _Subscriber:
+        subscriber = _Subscriber(max_queue_items)
+        self._subscribers[thread_id] = self._subscribers.get(thread_id, ()) + (subscriber,)
+        return subscriber
+
+    async def unsubscribe(self, thread_id: UUID, subscriber: _Subscriber) -> None:
+        subscribers = self._subscribers.get(thread_id)
+        if not subscribers:
+            return
+        remaining = tuple(item for item in subscribers if item is not subscriber)
+        if remaining:
+            self._subscribers[thread_id] = remaining
+        else:
+            self._subscribers.pop(thread_id, None)
+
+
+__all__ = ["SupportEventBus", "encode_sse"]
@@ -4,11 +4,11 @@ from datetime import datetime, timezone
 from uuid import UUID
 
 from fastapi import HTTPException, status
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session, load_only
 
 from app.models import AdminToken
-from app.security.crypto import decrypt_secret, encrypt_secret
+from app.security.crypto import decrypt_secret, encrypt_secret, invalidate_secret
 
 from app.admin.audit import AuditContext, record_audit
 
@@ -18,7 +18,20 @@ class TokenVaultService:
         self.db = db
 
     def list_tokens(self) -> list[AdminToken]:
-        stmt = select(AdminToken).order_by(AdminToken.created_at.desc())
+        # Listings never show the secret, so leave the ciphertext column unloaded.
+        stmt = (
+            select(AdminToken)
+            .options(
+                load_only(
+                    AdminToken.label,
+                    AdminToken.token_prefix,
+                    AdminToken.created_by,
+                    AdminToken.created_at,
+                    AdminToken.revoked_at,
+                )
+            )
+            .order_by(AdminToken.created_at.desc())
+        )
         return list(self.db.scalars(stmt))
 
     def create_token(
@@ -36,10 +49,10 @@ class TokenVaultService:
             token_ciphertext=encrypt_secret(token_plain),
             token_prefix=token_plain[:4],
             created_by=creator_user_id,
+            created_at=datetime.now(timezone.utc),
         )
         self.db.add(record)
-        self.db.commit()
-        self.db.refresh(record)
+        self.db.flush()
 
         record_audit(
             self.db,
@@ -50,30 +63,44 @@ class TokenVaultService:
             before=None,
             after={"label": record.label, "token_prefix": record.token_prefix},
         )
+        # Every column is set client-side; detach so the commit does not expire
+        # them and the response needs no refresh SELECT.
+        self.db.expunge(record)
         self.db.commit()
         return record
 
     def revoke_token(self, token_id: UUID, *, context: AuditContext) -> AdminToken:
-        token = self.db.get(AdminToken, token_id)
-        if not token:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Token not found.")
-        if token.revoked_at:
+        revoked_at = datetime.now(timezone.utc)
+        # Revoke-if-active and read the row back in one statement; the common
+        # case skips the SELECT that used to precede the UPDATE.
+        stmt = (
+            update(AdminToken)
+            .where(AdminToken.id == token_id, AdminToken.revoked_at.is_(None))
+            .values(revoked_at=revoked_at)
+            .returning(AdminToken)
+        )
+        token = self.db.scalars(
+            stmt, execution_options={"populate_existing": True}
+        ).one_or_none()
+        if token is None:
+            token = self.db.get(AdminToken, token_id)
+            if not token:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Token not found.")
             return token
-        before = {"revoked_at": token.revoked_at.isoformat() if token.revoked_at else None}
-        token.revoked_at = datetime.now(timezone.utc)
-        self.db.add(token)
-        self.db.commit()
-        self.db.refresh(token)
         record_audit(
             self.db,
             context=context,
             action="admin.token.revoke",
             target_type="admin_token",
             target_id=str(token.id),
-            before=before,
-            after={"revoked_at": token.revoked_at.isoformat()},
+            before={"revoked_at": None},
+            after={"revoked_at": revoked_at.isoformat()},
         )
+        # RETURNING loaded every column; detach so the commit does not expire
+        # them and the caller can serialize without a refresh.
+        self.db.expunge(token)
         self.db.commit()
+        invalidate_secret(token.id)
         return token
 
     def get_token_secret(self, token_id: UUID) -> str:
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
+from functools import lru_cache
 from typing import Tuple
 from uuid import UUID
 
@@ -11,6 +12,8 @@ VERSION_DESCRIPTIONS: dict[str, str] = {
     "devBack": "Phien ban cu duoc kich hoat lai do ban moi dang gap loi.",
 }
 
+_DEFAULT_DESCRIPTION = VERSION_DESCRIPTIONS["dev"]
+
 DEFAULT_VERSION_ENTRY = {
     "channel": "dev",
     "version": "v0.0.0",
@@ -21,25 +24,33 @@ DEFAULT_VERSION_ENTRY = {
 PLATFORM_VERSION_KEY = "platform.version"
 
 
+@lru_cache(maxsize=32)
+def _parse_updated_at(raw: str) -> datetime | None:
+    # The stored entry changes only when an admin edits it, so the same string
+    # is parsed on every read; caching also skips re-raising for bad values.
+    try:
+        return datetime.fromisoformat(raw)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=32)
+def _parse_updated_by(raw: str) -> UUID | None:
+    try:
+        return UUID(raw)
+    except ValueError:
+        return None
+
+
 def resolve_version_entry(value: dict) -> Tuple[str, str, str, datetime | None, UUID | None]:
     channel = value.get("channel") or DEFAULT_VERSION_ENTRY["channel"]
     version = value.get("version") or DEFAULT_VERSION_ENTRY["version"]
-    description = VERSION_DESCRIPTIONS.get(channel, VERSION_DESCRIPTIONS["dev"])
+    description = VERSION_DESCRIPTIONS.get(channel, _DEFAULT_DESCRIPTION)
 
-    updated_at = None
     updated_raw = value.get("updated_at")
-    if isinstance(updated_raw, str):
-        try:
-            updated_at = datetime.fromisoformat(updated_raw)
-        except ValueError:
-            updated_at = None
+    updated_at = _parse_updated_at(updated_raw) if isinstance(updated_raw, str) else None
 
-    updated_by = None
     updated_by_raw = value.get("updated_by")
-    if isinstance(updated_by_raw, str):
-        try:
-            updated_by = UUID(updated_by_raw)
-        except ValueError:
-            updated_by = None
+    updated_by = _parse_updated_by(updated_by_raw) if isinstance(updated_by_raw, str) else None
 
     return channel, version, description, updated_at, updated_by
@@ -195,19 +195,18 @@ class VpsService:
         self.db.refresh(session)
 
         if self.event_bus:
-            await self.event_bus.publish(
-                session.id,
-                {
-                    "event": "checklist.update",
-                    "data": {"items": session.checklist},
-                },
-            )
-            await self.event_bus.publish(
+            await self.event_bus.publish_many(
                 session.id,
-                {
-                    "event": "status.update",
-                    "data": {"status": session.status},
-                },
+                [
+                    {
+                        "event": "checklist.update",
+                        "data": {"items": session.checklist},
+                    },
+                    {
+                        "event": "status.update",
+                        "data": {"status": session.status},
+                    },
+                ],
             )
 
         action_to_use = worker_action or product.provision_action
@@ -356,19 +355,18 @@ class VpsService:
         self.db.refresh(session)
 
         if self.event_bus:
-            await self.event_bus.publish(
-                session.id,
-                {
-                    "event": "checklist.update",
-                    "data": {"items": session.checklist},
-                },
-            )
-            await self.event_bus.publish(
+            await self.event_bus.publish_many(
                 session.id,
-                {
-                    "event": "status.update",
-                    "data": {"status": session.status},
-                },
+                [
+                    {
+                        "event": "checklist.update",
+                        "data": {"items": session.checklist},
+                    },
+                    {
+                        "event": "status.update",
+                        "data": {"status": session.status},
+                    },
+                ],
             )
         return session, True
 
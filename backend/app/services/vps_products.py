@@ -1,22 +1,55 @@
 ﻿from __future__ import annotations
 
+import time
 from datetime import datetime, timezone
+from typing import Dict, Tuple
 from uuid import UUID
 
 from fastapi import HTTPException, status
 from sqlalchemy import select
-from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm import Session, load_only, raiseload, selectinload
 
 from app.admin.audit import AuditContext, record_audit
 from app.models import VpsProduct, Worker
 
+PRODUCTS_CACHE_SECONDS = 5.0
+
+# list_products results per include_inactive flag, stored as
+# (version, expires_at, products). Writes bump the version; the products are
+# detached from their session with workers loaded so later requests can read
+# them.
+_products_cache: Dict[bool, Tuple[int, float, list[VpsProduct]]] = {}
+_products_version = 0
+
+
+# Editable columns recorded in audit diffs; snapshots of the whole row (update
+# "before", delete) add the timestamps.
+_AUDIT_FIELDS = ("name", "description", "price_coins", "provision_action", "is_active")
+_SNAPSHOT_FIELDS = _AUDIT_FIELDS + ("created_at", "updated_at")
+
+
+def _snapshot(product: VpsProduct, fields: Tuple[str, ...]) -> dict[str, object]:
+    return {field: getattr(product, field) for field in fields}
+
+
+def _invalidate_products() -> None:
+    global _products_version
+    _products_version += 1
+    _products_cache.clear()
+
 
 class VpsProductService:
     def __init__(self, db: Session) -> None:
         self.db = db
 
     def _get_product(self, product_id: UUID) -> VpsProduct:
-        product = self.db.get(VpsProduct, product_id)
+        stmt = (
+            select(VpsProduct)
+            .options(selectinload(VpsProduct.workers))
+            .where(VpsProduct.id == product_id)
+            .execution_options(populate_existing=True)
+        )
+        product = self.db.scalars(stmt).one_or_none()
         if not product:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found.")
         return product
@@ -24,7 +57,14 @@ class VpsProductService:
     def _resolve_workers(self, worker_ids: list[UUID]) -> list[Worker]:
         if not worker_ids:
             return []
-        stmt = select(Worker).where(Worker.id.in_(worker_ids))
+        # Only the columns validated below are loaded; the association insert
+        # needs nothing but the identities, and the commit that follows
+        # expires the workers anyway.
+        stmt = (
+            select(Worker)
+            .options(load_only(Worker.id, Worker.status, Worker.name))
+            .where(Worker.id.in_(worker_ids))
+        )
         workers = list(self.db.scalars(stmt))
         found_ids = {worker.id for worker in workers}
         missing = [str(worker_id) for worker_id in worker_ids if worker_id not in found_ids]
@@ -46,10 +86,26 @@ class VpsProductService:
         return self._get_product(product_id)
 
     def list_products(self, include_inactive: bool = True) -> list[VpsProduct]:
-        stmt = select(VpsProduct).options(selectinload(VpsProduct.workers)).order_by(VpsProduct.created_at.desc())
+        version = _products_version
+        now = time.monotonic()
+        cached = _products_cache.get(include_inactive)
+        if cached is not None and cached[0] == version and cached[1] > now:
+            return list(cached[2])
+
+        stmt = (
+            select(VpsProduct)
+            .options(selectinload(VpsProduct.workers), raiseload("*"))
+            .order_by(VpsProduct.created_at.desc())
+        )
         if not include_inactive:
             stmt = stmt.where(VpsProduct.is_active.is_(True))
-        return list(self.db.scalars(stmt))
+        products = list(self.db.scalars(stmt))
+        loaded = {product: None for product in products}
+        loaded.update((worker, None) for product in products for worker in product.workers)
+        for instance in loaded:
+            self.db.expunge(instance)
+        _products_cache[include_inactive] = (version, now + PRODUCTS_CACHE_SECONDS, products)
+        return list(products)
 
     def create_product(
         self,
@@ -74,8 +130,8 @@ class VpsProductService:
         workers = self._resolve_workers(worker_ids)
         product.workers = workers
         self.db.add(product)
-        self.db.commit()
-        self.db.refresh(product)
+        self.db.flush()
+        product_id = product.id
         record_audit(
             self.db,
             context=context,
@@ -83,15 +139,11 @@ class VpsProductService:
             target_type="vps_product",
             target_id=str(product.id),
             before=None,
-            after={
-                "name": product.name,
-                "price_coins": product.price_coins,
-                "provision_action": product.provision_action,
-                "is_active": product.is_active,
-            },
+            after=_snapshot(product, _AUDIT_FIELDS),
         )
         self.db.commit()
-        return product
+        _invalidate_products()
+        return self._get_product(product_id)
 
     def update_product(
         self,
@@ -106,19 +158,7 @@ class VpsProductService:
         context: AuditContext,
     ) -> VpsProduct:
         product = self._get_product(product_id)
-        created_at = product.created_at
-        updated_at = product.updated_at
-        before = {
-            "name": product.name,
-            "description": product.description,
-            "price_coins": product.price_coins,
-            "provision_action": product.provision_action,
-            "is_active": product.is_active,
-            "created_at": product.created_at,
-            "updated_at": product.updated_at,
-            "provision_action": product.provision_action,
-            "is_active": product.is_active,
-        }
+        before = _snapshot(product, _SNAPSHOT_FIELDS)
         if name is not None:
             product.name = name.strip()
         if description is not None:
@@ -135,15 +175,7 @@ class VpsProductService:
             product.workers = self._resolve_workers(worker_ids)
         product.updated_at = datetime.now(timezone.utc)
         self.db.add(product)
-        self.db.commit()
-        self.db.refresh(product)
-        after = {
-            "name": product.name,
-            "description": product.description,
-            "price_coins": product.price_coins,
-            "provision_action": product.provision_action,
-            "is_active": product.is_active,
-        }
+        after = _snapshot(product, _AUDIT_FIELDS)
         record_audit(
             self.db,
             context=context,
@@ -154,7 +186,8 @@ class VpsProductService:
             after=after,
         )
         self.db.commit()
-        return product
+        _invalidate_products()
+        return self._get_product(product_id)
 
     def deactivate_product(self, product_id: UUID, *, context: AuditContext) -> VpsProduct:
         product = self._get_product(product_id)
@@ -162,8 +195,6 @@ class VpsProductService:
         product.is_active = False
         product.updated_at = datetime.now(timezone.utc)
         self.db.add(product)
-        self.db.commit()
-        self.db.refresh(product)
         record_audit(
             self.db,
             context=context,
@@ -174,20 +205,12 @@ class VpsProductService:
             after={"is_active": product.is_active},
         )
         self.db.commit()
-        return product
+        _invalidate_products()
+        return self._get_product(product_id)
 
     def delete_product(self, product_id: UUID, *, context: AuditContext) -> dict[str, object]:
         product = self._get_product(product_id)
-        before = {
-            "name": product.name,
-            "description": product.description,
-            "price_coins": product.price_coins,
-            "provision_action": product.provision_action,
-            "is_active": product.is_active,
-            "created_at": product.created_at,
-            "updated_at": product.updated_at,
-            "is_active": product.is_active,
-        }
+        before = _snapshot(product, _SNAPSHOT_FIELDS)
         target_id = str(product.id)
         self.db.delete(product)
         record_audit(
@@ -200,14 +223,5 @@ class VpsProductService:
             after=None,
         )
         self.db.commit()
-        before_snapshot = {
-            "id": target_id,
-            "name": before["name"],
-            "description": before["description"],
-            "price_coins": before["price_coins"],
-            "provision_action": before["provision_action"],
-            "is_active": before["is_active"],
-            "created_at": before["created_at"],
-            "updated_at": before["updated_at"],
-        }
-        return before_snapshot
+        _invalidate_products()
+        return {"id": target_id, **before}
@@ -1,12 +1,13 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from datetime import datetime, timezone
 from typing import Optional
 from uuid import UUID
 
 from fastapi import HTTPException, status
-from sqlalchemy import select
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
 from app.models import AdReward, LedgerEntry, User, Wallet
@@ -23,7 +24,7 @@ class WalletService:
         self.db = db
 
     def get_balance(self, user: User) -> WalletBalance:
-        wallet = self._get_wallet(user.id, lock=False)
+        wallet = self._get_wallet(user.id)
         balance = int(wallet.balance if wallet else user.coins or 0)
         return WalletBalance(user_id=user.id, balance=balance)
 
@@ -36,26 +37,15 @@ class WalletService:
         ref_id: Optional[UUID] = None,
         meta: Optional[dict] = None,
     ) -> WalletBalance:
-        wallet = self._get_wallet(user.id, lock=True)
-        if wallet is None:
-            seed_balance = int(user.coins or 0)
-            wallet = Wallet(user_id=user.id, balance=seed_balance)
-            self.db.add(wallet)
-            self.db.flush()
-        else:
-            seed_balance = int(wallet.balance or 0)
-
-        new_balance = seed_balance + int(amount)
-        if new_balance < 0:
+        amount = int(amount)
+        new_balance = self._apply_delta(user, amount)
+        if new_balance is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Insufficient balance",
             )
 
-        wallet.balance = new_balance
-        wallet.updated_at = datetime.now(timezone.utc)
         user.coins = new_balance  # keep legacy field in sync
-        self.db.add(wallet)
         self.db.add(user)
 
         ledger_entry = LedgerEntry(
@@ -83,12 +73,39 @@ class WalletService:
         reward.device_hash = device_hash
         reward.meta = meta or {}
 
-    def _get_wallet(self, user_id: UUID, *, lock: bool) -> Wallet | None:
+    def _apply_delta(self, user: User, amount: int) -> int | None:
+        # The balance check lives in the WHERE clause, so the row is updated and
+        # read back in one round-trip without holding a lock across Python work.
+        # No row means either insufficient funds or no wallet yet.
+        new_balance = self.db.execute(
+            update(Wallet)
+            .where(Wallet.user_id == user.id, Wallet.balance + amount >= 0)
+            .values(balance=Wallet.balance + amount, updated_at=func.now())
+            .returning(Wallet.balance)
+        ).scalar_one_or_none()
+        if new_balance is not None:
+            return int(new_balance)
+
+        seeded_balance = int(user.coins or 0) + amount
+        if seeded_balance < 0:
+            return None
+        # First adjustment seeds the wallet from the legacy coins column; the
+        # conflict branch covers a wallet created concurrently since the UPDATE.
+        stmt = self._dialect_insert()(Wallet).values(user_id=user.id, balance=seeded_balance)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={"balance": Wallet.balance + amount, "updated_at": func.now()},
+            where=Wallet.balance + amount >= 0,
+        ).returning(Wallet.balance)
+        new_balance = self.db.execute(stmt).scalar_one_or_none()
+        return None if new_balance is None else int(new_balance)
+
+    def _dialect_insert(self):
+        return sqlite_insert if self.db.get_bind().dialect.name == "sqlite" else pg_insert
+
+    def _get_wallet(self, user_id: UUID) -> Wallet | None:
         stmt = select(Wallet).where(Wallet.user_id == user_id)
-        if lock:
-            stmt = stmt.with_for_update()
-        result = self.db.execute(stmt).scalar_one_or_none()
-        return result
+        return self.db.execute(stmt).scalar_one_or_none()
 
 
 __all__ = [
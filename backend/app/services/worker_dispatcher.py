@@ -1,20 +1,38 @@
 ﻿from __future__ import annotations
 
-import asyncio
+from functools import lru_cache
 from typing import Any, Dict
 from uuid import UUID
 
 import httpx
+import orjson
 
 from app.models import VpsProduct, VpsSession, Worker
 from app.settings import get_settings
 
 
+@lru_cache(maxsize=256)
+def _job_url(base_url: str) -> str:
+    return base_url.rstrip("/") + "/job/create"
+
+
+@lru_cache(maxsize=8)
+def _callback_urls(callback_base: str) -> Dict[str, str]:
+    # Shared between payloads; only ever serialized, never mutated.
+    return {
+        "status": f"{callback_base}/workers/callback/status",
+        "checklist": f"{callback_base}/workers/callback/checklist",
+        "result": f"{callback_base}/workers/callback/result",
+    }
+
+
 class WorkerDispatcher:
     def __init__(self) -> None:
         timeout = httpx.Timeout(10.0, connect=5.0)
-        self._client = httpx.AsyncClient(timeout=timeout)
-        self._lock = asyncio.Lock()
+        # AsyncClient is safe for concurrent use; dispatches run in parallel,
+        # bounded by the pool.
+        limits = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+        self._client = httpx.AsyncClient(timeout=timeout, limits=limits)
         self._settings = get_settings()
 
     async def aclose(self) -> None:
@@ -31,31 +49,28 @@ class WorkerDispatcher:
         auth_token: str,
         extra: Dict[str, Any] | None = None,
     ) -> httpx.Response:
+        # orjson encodes UUIDs natively in the same canonical form as str().
         payload: Dict[str, Any] = {
-            "worker_id": str(worker.id),
-            "session_id": str(session.id),
+            "worker_id": worker.id,
+            "session_id": session.id,
             "session_token": session_token,
             "product": {
-                "id": str(product.id) if product.id else None,
+                "id": product.id,
                 "name": product.name,
                 "price_coins": product.price_coins,
                 "description": product.description,
             },
-            "callback_urls": {
-                "status": f"{callback_base}/workers/callback/status",
-                "checklist": f"{callback_base}/workers/callback/checklist",
-                "result": f"{callback_base}/workers/callback/result",
-            },
+            "callback_urls": _callback_urls(callback_base),
         }
         if extra:
             payload.update(extra)
-        url = worker.base_url.rstrip("/") + "/job/create"
         headers = {
             "Authorization": f"Bearer {auth_token}",
             "Content-Type": "application/json",
         }
-        async with self._lock:
-            response = await self._client.post(url, json=payload, headers=headers)
+        response = await self._client.post(
+            _job_url(worker.base_url), content=orjson.dumps(payload), headers=headers
+        )
         response.raise_for_status()
         return response
 
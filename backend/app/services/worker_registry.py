@@ -11,9 +11,25 @@ from sqlalchemy.orm import Session
 
 from app.admin.audit import AuditContext, record_audit
 from app.models import Worker, VpsSession
+from app.services.vps_products import _invalidate_products
 
 ACTIVE_STATUSES = {"pending", "provisioning", "ready"}
 
+_health_client: httpx.Client | None = None
+
+
+def _get_health_client() -> httpx.Client:
+    # Shared so repeated registrations against the same worker reuse a pooled
+    # keep-alive connection instead of a fresh TCP+TLS handshake per check.
+    global _health_client
+    if _health_client is None:
+        _health_client = httpx.Client(
+            timeout=5.0,
+            verify=False,
+            limits=httpx.Limits(max_keepalive_connections=10),
+        )
+    return _health_client
+
 
 class WorkerRegistryService:
     def __init__(self, db: Session) -> None:
@@ -25,31 +41,42 @@ class WorkerRegistryService:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="base_url required")
         return url.rstrip("/")
 
-    def _active_session_counts(self, worker_ids: list[UUID]) -> dict[UUID, int]:
-        if not worker_ids:
-            return {}
-        stmt = (
-            select(VpsSession.worker_id, func.count(VpsSession.id))
-            .where(VpsSession.worker_id.in_(worker_ids))
+    @staticmethod
+    def _active_sessions_column():
+        return (
+            select(func.count(VpsSession.id))
+            .where(VpsSession.worker_id == Worker.id)
             .where(VpsSession.status.in_(ACTIVE_STATUSES))
-            .group_by(VpsSession.worker_id)
+            .correlate(Worker)
+            .scalar_subquery()
         )
-        return {row[0]: row[1] for row in self.db.execute(stmt).all()}
+
+    def _load_worker(self, worker_id: UUID) -> Worker | None:
+        """Load a worker and its active session count in one query."""
+        stmt = (
+            select(Worker, self._active_sessions_column())
+            .where(Worker.id == worker_id)
+            .execution_options(populate_existing=True)
+        )
+        row = self.db.execute(stmt).one_or_none()
+        if row is None:
+            return None
+        worker, active_sessions = row
+        setattr(worker, "_active_sessions", active_sessions)
+        return worker
 
     def list_workers(self) -> list[Worker]:
-        stmt = select(Worker).order_by(Worker.created_at.desc())
-        workers = list(self.db.scalars(stmt))
-        counts = self._active_session_counts([worker.id for worker in workers])
-        for worker in workers:
-            setattr(worker, "_active_sessions", counts.get(worker.id, 0))
+        stmt = select(Worker, self._active_sessions_column()).order_by(Worker.created_at.desc())
+        workers = []
+        for worker, active_sessions in self.db.execute(stmt):
+            setattr(worker, "_active_sessions", active_sessions)
+            workers.append(worker)
         return workers
 
     def get_worker(self, worker_id: UUID) -> Worker:
-        worker = self.db.get(Worker, worker_id)
+        worker = self._load_worker(worker_id)
         if not worker:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Worker not found.")
-        counts = self._active_session_counts([worker.id])
-        setattr(worker, "_active_sessions", counts.get(worker.id, 0))
         return worker
 
     def register_worker(
@@ -63,11 +90,7 @@ class WorkerRegistryService:
         normalized_url = self._normalize_url(base_url)
 
         try:
-            response = httpx.get(
-                urljoin(normalized_url + "/", "health"),
-                timeout=5.0,
-                verify=False,
-            )
+            response = _get_health_client().get(urljoin(normalized_url + "/", "health"))
             response.raise_for_status()
         except httpx.HTTPError as exc:
             raise HTTPException(
@@ -80,26 +103,18 @@ class WorkerRegistryService:
                 detail=f"Could not reach worker at {normalized_url}: {exc}",
             ) from exc
 
+        now = datetime.now(timezone.utc)
         worker = Worker(
             name=name,
             base_url=normalized_url,
             status="active",
             max_sessions=max_sessions,
-            updated_at=datetime.now(timezone.utc),
+            created_at=now,
+            updated_at=now,
         )
         self.db.add(worker)
         try:
-            self.db.commit()
-        except Exception as exc:  # pragma: no cover - defensive
-            self.db.rollback()
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Unable to store worker record: {exc}",
-            ) from exc
-        self.db.refresh(worker)
-        setattr(worker, "_active_sessions", 0)
-
-        try:
+            self.db.flush()
             record_audit(
                 self.db,
                 context=context,
@@ -113,13 +128,17 @@ class WorkerRegistryService:
                     "max_sessions": worker.max_sessions,
                 },
             )
+            # All columns are set client-side, so keep them loaded past the
+            # commit instead of re-SELECTing the row we just inserted.
+            self.db.expunge(worker)
             self.db.commit()
         except Exception as exc:  # pragma: no cover - defensive
             self.db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Unable to record audit entry: {exc}",
+                detail=f"Unable to store worker record: {exc}",
             ) from exc
+        setattr(worker, "_active_sessions", 0)
         return worker
 
     def update_worker(
@@ -151,10 +170,6 @@ class WorkerRegistryService:
             worker.max_sessions = max_sessions
         worker.updated_at = datetime.now(timezone.utc)
         self.db.add(worker)
-        self.db.commit()
-        self.db.refresh(worker)
-        counts = self._active_session_counts([worker.id])
-        setattr(worker, "_active_sessions", counts.get(worker.id, 0))
         after = {
             "name": worker.name,
             "base_url": worker.base_url,
@@ -171,7 +186,9 @@ class WorkerRegistryService:
             after=after,
         )
         self.db.commit()
-        return worker
+        # Cached product listings carry detached copies of their workers.
+        _invalidate_products()
+        return self._load_worker(worker_id)
 
     def list_active_sessions(self, worker_id: UUID) -> list[VpsSession]:
         stmt = (
@@ -182,13 +199,8 @@ class WorkerRegistryService:
         return list(self.db.scalars(stmt))
 
     def delete_worker(self, worker_id: UUID, *, context: AuditContext) -> None:
-        worker = self.db.get(Worker, worker_id)
-        if not worker:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Worker not found.")
-
-        counts = self._active_session_counts([worker.id])
-        active_sessions = counts.get(worker.id, 0)
-        if active_sessions:
+        worker = self.get_worker(worker_id)
+        if getattr(worker, "_active_sessions", 0):
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail="Worker still has active sessions.",
@@ -214,3 +226,4 @@ class WorkerRegistryService:
             after=None,
         )
         self.db.commit()
+        _invalidate_products()
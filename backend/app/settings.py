@@ -1,7 +1,7 @@
 import ipaddress
 import re
-from functools import lru_cache
-from typing import List, Set
+from functools import cached_property, lru_cache
+from typing import FrozenSet, List
 from urllib.parse import urlparse
 
 from pydantic import AliasChoices, AnyHttpUrl, Field
@@ -14,6 +14,10 @@ class Settings(BaseSettings):
     discord_redirect_uri: AnyHttpUrl = Field(..., alias="DISCORD_REDIRECT_URI")
     secret_key: str = Field(..., alias="SECRET_KEY")
     database_url: str = Field(..., alias="DATABASE_URL")
+    db_pool_size: int = Field(10, alias="DB_POOL_SIZE", ge=1)
+    db_max_overflow: int = Field(20, alias="DB_MAX_OVERFLOW", ge=0)
+    db_pool_recycle: int = Field(1800, alias="DB_POOL_RECYCLE", ge=-1)
+    db_pool_timeout: int = Field(10, alias="DB_POOL_TIMEOUT", ge=1)
     base_url: AnyHttpUrl = Field(..., alias="BASE_URL")
     allowed_origins: str = Field("*", alias="ALLOWED_ORIGINS")
     cookie_secure: bool = Field(False, alias="COOKIE_SECURE")
@@ -71,6 +75,14 @@ class Settings(BaseSettings):
         extra="ignore",
     )
 
+    def model_copy(self, *, update=None, deep: bool = False) -> "Settings":
+        copied = super().model_copy(update=update, deep=deep)
+        # cached_property values live in __dict__ and would otherwise be
+        # copied along, stale with respect to ``update``.
+        for name in _CACHED_VIEWS:
+            copied.__dict__.pop(name, None)
+        return copied
+
     @staticmethod
     def _origin_from_url(value: str | AnyHttpUrl | None) -> str | None:
         if not value:
@@ -99,7 +111,7 @@ class Settings(BaseSettings):
                 variants.append(https_origin)
         return variants
 
-    @property
+    @cached_property
     def allowed_origins_list(self) -> List[str]:
         raw = (self.allowed_origins or "").strip()
         if raw == "*":
@@ -133,21 +145,21 @@ class Settings(BaseSettings):
     def discord_scopes(self) -> str:
         return "identify email"
 
-    @property
+    @cached_property
     def feature_flags_list(self) -> List[str]:
         raw = self.feature_flags.strip()
         if not raw:
             return []
         return [flag.strip() for flag in raw.split(",") if flag.strip()]
 
-    @property
-    def feature_flags_set(self) -> Set[str]:
-        return {flag.lower() for flag in self.feature_flags_list}
+    @cached_property
+    def feature_flags_set(self) -> FrozenSet[str]:
+        return frozenset(flag.lower() for flag in self.feature_flags_list)
 
     def is_feature_enabled(self, flag: str) -> bool:
         return flag.lower() in self.feature_flags_set
 
-    @property
+    @cached_property
     def frontend_redirect_target(self) -> str:
         target = (self.frontend_redirect_url or "").strip()
         if not target:
@@ -185,6 +197,16 @@ class Settings(BaseSettings):
         return [item.strip() for item in raw.split(",") if item.strip()]
 
 
+# Parsed views cached on first access; get_settings builds Settings once per
+# process, so they never need recomputing.
+_CACHED_VIEWS = (
+    "allowed_origins_list",
+    "feature_flags_list",
+    "feature_flags_set",
+    "frontend_redirect_target",
+)
+
+
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
     return Settings()
@@ -4,12 +4,15 @@ import secrets
 from typing import Any, Dict
 
 from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from starlette.requests import Request
 from starlette.responses import Response
+from starlette.types import Message
 
 STATE_COOKIE_NAME = "discord_oauth_state"
 STATE_MAX_AGE_SECONDS = 600
 SESSION_MAX_AGE_SECONDS = 60 * 60 * 24 * 7
 SESSION_SALT = "discord-login-session"
+CACHED_BODY_SCOPE_KEY = "app.cached_body"
 STATE_SALT = "discord-login-state"
 
 
@@ -69,3 +72,30 @@ def clear_cookie(response: Response, *, name: str) -> None:
 
 def is_bad_signature(error: Exception) -> bool:
     return isinstance(error, (BadSignature, SignatureExpired))
+
+
+async def read_cached_body(request: Request) -> bytes:
+    """Read the request body once and keep it on the ASGI scope.
+
+    Every ``Request`` built over the same scope (middleware, dependencies,
+    the endpoint) sees the same bytes, and the receive channel replays the
+    body once so a later reader does not block on a drained stream.
+    """
+    cached = request.scope.get(CACHED_BODY_SCOPE_KEY)
+    if cached is not None:
+        return cached
+    body = await request.body()
+    request.scope[CACHED_BODY_SCOPE_KEY] = body
+    receive = request.receive
+    replayed = False
+
+    async def _replay() -> Message:
+        nonlocal replayed
+        if replayed:
+            # Body already delivered; pass through so disconnects still arrive.
+            return await receive()
+        replayed = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    request._receive = _replay  # noqa: SLF001 - starlette has no public setter
+    return body
@@ -606,16 +606,19 @@ const Support = () => {
         }));
       } catch {}
     };
+    const onReplyFailed = () => toast("Trợ lý Kyaro chưa phản hồi được, vui lòng thử lại.");
 
     sse.addEventListener("thread.snapshot", onSnapshot);
     sse.addEventListener("message.created", onCreated);
     sse.addEventListener("thread.status", onStatus);
+    sse.addEventListener("reply.failed", onReplyFailed);
     sse.onerror = () => console.warn("SSE bị gián đoạn, đang thử lại...");
 
     return () => {
       sse.removeEventListener("thread.snapshot", onSnapshot);
       sse.removeEventListener("message.created", onCreated);
       sse.removeEventListener("thread.status", onStatus);
+      sse.removeEventListener("reply.failed", onReplyFailed);
       sse.close();
       sseRef.current = null;
     };
@@ -359,3 +359,112 @@ def test_admin_role_detail_page(client_with_db):
     assert any(perm["code"] == "custom:build" for perm in payload["permissions"])
 
     client.app.dependency_overrides.pop(override, None)
+
+
+def test_public_announcements_paginate_and_etag(client_with_db):
+    client, SessionLocal = client_with_db
+    from app.models import Announcement
+
+    with SessionLocal() as db:
+        for index in range(3):
+            db.add(
+                Announcement(
+                    title=f"Post {index}",
+                    slug=f"post-{index}",
+                    message="body",
+                    content="body",
+                    attachments=[],
+                )
+            )
+        db.commit()
+
+    response = client.get("/announcements", params={"limit": 2})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    etag = response.headers["ETag"]
+
+    cached = client.get("/announcements", params={"limit": 2}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+
+    response = client.get("/announcements", params={"limit": 2, "offset": 2})
+    assert len(response.json()) == 1
+
+
+class _VersionRedis:
+    def __init__(self) -> None:
+        self.values: dict[str, int] = {}
+
+    def get(self, key):
+        value = self.values.get(key)
+        return None if value is None else str(value)
+
+    def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+
+def test_permission_catalog_follows_shared_version(client_with_db, monkeypatch):
+    from app.admin.cache import get_permission_cache
+    from app.admin.models import Permission
+    from app.admin.services import roles as roles_service
+
+    _, session_maker = client_with_db
+    redis_client = _VersionRedis()
+    monkeypatch.setattr(get_permission_cache(), "_redis", redis_client)
+    monkeypatch.setattr(roles_service, "_permission_catalog", None)
+
+    with session_maker() as db:
+        before = {perm.code for perm in roles_service.list_all_permissions(db)}
+        db.add(Permission(code="catalog:probe"))
+        db.commit()
+        # Still cached: nothing bumped the shared version yet.
+        assert {perm.code for perm in roles_service.list_all_permissions(db)} == before
+
+        # Another worker changing the catalog bumps the version in Redis.
+        redis_client.incr("admin:perms:catalog:version")
+        codes = {perm.code for perm in roles_service.list_all_permissions(db)}
+    assert codes == before | {"catalog:probe"}
+
+
+def test_profile_query_needs_status_permission(client_with_db, monkeypatch):
+    client, SessionLocal = client_with_db
+    from app.admin.cache import get_permission_cache
+    from app.admin.seed import grant_role_to_user
+
+    started = []
+
+    class _RecordingProfiler:
+        def __init__(self, *args, **kwargs):
+            started.append(self)
+
+        def start(self):
+            pass
+
+        def stop(self):
+            pass
+
+        def output_html(self):
+            return "<html>profile</html>"
+
+    monkeypatch.setattr(main_module, "Profiler", _RecordingProfiler)
+    monkeypatch.setattr(main_module, "SessionLocal", SessionLocal)
+
+    user = _create_user(SessionLocal, username="profile_user")
+    user_id = user.id
+    session_token = main_module.utils.sign_session(
+        get_settings().secret_key, {"user_id": str(user_id)}
+    )
+    _set_session_cookie(client, session_token)
+
+    response = client.get("/health", params={"profile": "1"})
+    assert response.status_code == 200
+    assert response.json()["ok"] is True
+    assert started == []
+
+    with SessionLocal() as db:
+        grant_role_to_user(db, user, "admin")
+    get_permission_cache().invalidate(user_id)
+
+    profiled = client.get("/health", params={"profile": "1"})
+    assert profiled.text == "<html>profile</html>"
+    assert len(started) == 1
@@ -2,12 +2,18 @@ import asyncio
 import hashlib
 import hmac
 import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
 from types import SimpleNamespace
 from uuid import uuid4
 
 import pytest
 from fastapi import HTTPException
-from sqlalchemy import create_engine, select
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.orm import Session, sessionmaker
 
 # Configure environment for tests
@@ -19,13 +25,31 @@ os.environ.setdefault("DATABASE_URL", "sqlite+pysqlite:///./test-service.db")
 os.environ.setdefault("BASE_URL", "https://example.com")
 os.environ.setdefault("ENCRYPTION_KEY", "0123456789abcdef0123456789abcdef")
 
+from app.admin.audit import AuditContext
+from app.api.support import _generate_and_publish
 from app.db import Base
-from app.models import LedgerEntry, User, VpsProduct, Worker
-from app.services.ads import AdsNonceError, AdsNonceManager, SSVSignatureVerifier
+from app.models import AdReward, LedgerEntry, User, UserLimit, VpsProduct, Worker
+import app.security.crypto as crypto_module
+from app.security.crypto import (
+    cached_secret,
+    cached_signing_key,
+    compute_worker_signature,
+    decrypt_secret,
+    encrypt_secret,
+    verify_worker_signature,
+)
+from app.services.ads import AdsNonceError, AdsNonceManager, AdsService, SSVSignatureVerifier
 from app.services.wallet import WalletService
 from app.services.vps import VpsService
+from app.services.vps_products import VpsProductService
 from app.services.event_bus import SessionEventBus
+from app.services.giftcodes import GiftCodeService
+from app.services.support_event_bus import SupportEventBus
+from app.services.token_vault import TokenVaultService
+from app.services.worker_registry import WorkerRegistryService
+from app.services.rate_limiter import RateLimiter
 from app.services.worker_client import WorkerClient
+from app.settings import get_settings
 
 
 class DummyWorkerClient(WorkerClient):
@@ -56,9 +80,9 @@ class RecordingEventBus(SessionEventBus):
         super().__init__()
         self.events: list[tuple] = []
 
-    async def publish(self, session_id, event):  # type: ignore[override]
-        self.events.append((session_id, event))
-        await super().publish(session_id, event)
+    async def publish_many(self, session_id, events):  # type: ignore[override]
+        self.events.extend((session_id, event) for event in events)
+        await super().publish_many(session_id, events)
 
 
 @pytest.fixture()
@@ -73,6 +97,21 @@ def db_session(tmp_path):
         Base.metadata.drop_all(bind=engine)
 
 
+@contextmanager
+def capture_statements(session: Session):
+    """Collect the SQL text of every statement executed on ``session``'s engine."""
+    statements: list[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(session.bind, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(session.bind, "before_cursor_execute", record)
+
+
 @pytest.mark.asyncio
 async def test_purchase_and_create_idempotent(db_session: Session):
     user = User(id=uuid4(), discord_id="d1", username="user", coins=100)
@@ -122,6 +161,108 @@ async def test_purchase_and_create_idempotent(db_session: Session):
     assert wallet_service.get_balance(user).balance == 75, "Coins should not be deducted twice"
 
 
+def test_giftcode_redeem_claims_uses_and_reports_failures(db_session: Session):
+    user = User(id=uuid4(), discord_id="gift", username="gift", coins=0)
+    db_session.add(user)
+    db_session.commit()
+    service = GiftCodeService(db_session)
+    code = f"GIFT-{uuid4().hex[:8]}"
+
+    with pytest.raises(HTTPException) as exc:
+        service.redeem_code(user=user, code=code)
+    assert exc.value.status_code == 404
+
+    gift_code = service.create_code(
+        title="Gift", code=code, reward_amount=5, total_uses=2, is_active=True, created_by=None
+    )
+    redemption, _ = service.redeem_code(user=user, code=code.lower())
+    assert redemption.gift_code_id == gift_code.id
+    assert user.coins == 5
+    with pytest.raises(HTTPException) as exc:
+        service.redeem_code(user=user, code=code)
+    assert exc.value.detail == "giftcode_already_redeemed"
+
+    others = [User(id=uuid4(), discord_id=f"gift-{i}", username=f"gift-{i}", coins=0) for i in range(2)]
+    db_session.add_all(others)
+    db_session.commit()
+    _, updated = service.redeem_code(user=others[0], code=code)
+    assert updated.redeemed_count == 2
+    with pytest.raises(HTTPException) as exc:
+        service.redeem_code(user=others[1], code=code)
+    assert exc.value.detail == "giftcode_out_of_stock"
+
+    service.update_code(gift_code, code=f"{code}-NEW")
+    with pytest.raises(HTTPException) as exc:
+        service.redeem_code(user=user, code=code)
+    assert exc.value.status_code == 404
+
+
+def test_vps_product_workers_load_eagerly(db_session: Session):
+    worker = Worker(name="w", base_url="http://worker", status="active", max_sessions=1)
+    db_session.add(worker)
+    db_session.commit()
+    service = VpsProductService(db_session)
+    product = service.create_product(
+        name="p",
+        description=None,
+        price_coins=1,
+        provision_action=1,
+        is_active=True,
+        worker_ids=[worker.id],
+        context=AuditContext(actor_user_id=None, ip=None, ua=None),
+    )
+    assert [item.id for item in product.workers] == [worker.id]
+    db_session.expunge_all()
+
+    with capture_statements(db_session) as statements:
+        loaded = service.get_product(product.id)
+        assert [item.name for item in loaded.workers] == ["w"]
+    assert len(statements) <= 2
+
+    db_session.expunge_all()
+    with pytest.raises(InvalidRequestError):
+        _ = db_session.get(VpsProduct, product.id).workers
+
+
+def test_worker_updates_refresh_cached_products(db_session: Session):
+    worker = Worker(name="before", base_url="http://worker", status="active", max_sessions=1)
+    db_session.add(worker)
+    db_session.commit()
+    context = AuditContext(actor_user_id=None, ip=None, ua=None)
+    products = VpsProductService(db_session)
+    products.create_product(
+        name="p",
+        description=None,
+        price_coins=1,
+        provision_action=1,
+        is_active=True,
+        worker_ids=[worker.id],
+        context=context,
+    )
+    assert [w.name for w in products.list_products()[0].workers] == ["before"]
+
+    WorkerRegistryService(db_session).update_worker(worker.id, name="after", context=context)
+    assert [w.name for w in products.list_products()[0].workers] == ["after"]
+
+
+def test_token_vault_writes_skip_refresh(db_session: Session):
+    service = TokenVaultService(db_session)
+    context = AuditContext(actor_user_id=None, ip=None, ua=None)
+    with capture_statements(db_session) as statements:
+        token = service.create_token(
+            label="ops", token_plain="secret-token", creator_user_id=None, context=context
+        )
+        assert token.created_at is not None and token.token_prefix == "secr"
+        revoked = service.revoke_token(token.id, context=context)
+        assert revoked.revoked_at is not None and revoked.label == "ops"
+    assert not any(statement.lstrip().startswith("SELECT") for statement in statements)
+
+    assert service.revoke_token(token.id, context=context).revoked_at == revoked.revoked_at
+    with pytest.raises(HTTPException) as exc:
+        service.revoke_token(uuid4(), context=context)
+    assert exc.value.status_code == 404
+
+
 def test_wallet_service_adjustments(db_session: Session):
     user = User(id=uuid4(), discord_id="wallet", username="wallet", coins=0)
     db_session.add(user)
@@ -140,6 +281,54 @@ def test_wallet_service_adjustments(db_session: Session):
 
     with pytest.raises(HTTPException):
         wallet.adjust_balance(user, -100, entry_type="debit.fail", ref_id=None)
+    assert wallet.get_balance(user).balance == 7
+
+    legacy = User(id=uuid4(), discord_id="legacy", username="legacy", coins=5)
+    db_session.add(legacy)
+    db_session.commit()
+    with pytest.raises(HTTPException) as exc:
+        wallet.adjust_balance(legacy, -6, entry_type="debit.fail", ref_id=None)
+    assert exc.value.status_code == 400
+    assert wallet.adjust_balance(legacy, -5, entry_type="debit.test", ref_id=None).balance == 0
+    assert legacy.coins == 0
+
+
+@pytest.mark.asyncio
+async def test_support_event_bus_drops_oldest_frames():
+    bus = SupportEventBus()
+    thread_id = uuid4()
+    subscriber = await bus.subscribe(thread_id, max_queue_items=2)
+    for index in range(3):
+        await bus.publish(thread_id, {"event": "message.created", "data": {"n": index}})
+
+    frames = await subscriber.drain(wait_seconds=0.01)
+    assert frames == [
+        b'event: message.created\ndata: {"n":1}\n\n',
+        b'event: message.created\ndata: {"n":2}\n\n',
+    ]
+    assert await subscriber.drain(wait_seconds=0.01) == []
+
+    await bus.unsubscribe(thread_id, subscriber)
+    await bus.publish(thread_id, {"event": "message.created", "data": {}})
+    assert await subscriber.drain(wait_seconds=0.01) == []
+
+
+class FailingAssistant:
+    async def generate_reply(self, *, system_prompt, history):
+        raise RuntimeError("upstream closed the connection")
+
+
+@pytest.mark.asyncio
+async def test_kyaro_reply_failure_is_published():
+    bus = SupportEventBus()
+    thread_id = uuid4()
+    subscriber = await bus.subscribe(thread_id)
+
+    await _generate_and_publish(thread_id, "prompt", [], FailingAssistant(), bus)
+
+    [frame] = await subscriber.drain(wait_seconds=0.01)
+    assert frame.startswith(b"event: reply.failed\n")
+    assert str(thread_id).encode() in frame
 
 
 def test_ads_nonce_manager_roundtrip():
@@ -157,6 +346,157 @@ def test_ads_nonce_manager_roundtrip():
         manager.consume(uuid4(), "missing")
 
 
+class SlowPopStore(OrderedDict):
+    def popitem(self, last=True):
+        # Widen the window between _sweep reading the oldest entry and popping it.
+        time.sleep(0.0005)
+        return super().popitem(last=last)
+
+
+def test_ads_nonce_manager_memory_store_is_thread_safe():
+    manager = AdsNonceManager(ttl_seconds=30)
+    manager._store = SlowPopStore()
+    user_id = uuid4()
+    errors: list[BaseException] = []
+
+    def roundtrip(worker: int) -> None:
+        for index in range(100):
+            # An expired entry ahead of each live nonce keeps every call sweeping.
+            manager._remember(f"stale-{worker}-{index}", ("uid", "d", "earn", 0.0), time.time())
+            nonce = manager.issue(user_id, "device-hash", "earn")
+            try:
+                manager.consume(user_id, nonce)
+            except Exception as exc:  # pragma: no cover - asserted below
+                errors.append(exc)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(roundtrip, range(8)))
+
+    assert errors == []
+    assert not manager._store
+
+
+class DictRedis:
+    def __init__(self) -> None:
+        self.values: dict[str, str] = {}
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value
+
+    def getdel(self, key):
+        return self.values.pop(key, None)
+
+
+def test_ads_nonce_manager_redis_payloads():
+    redis_client = DictRedis()
+    manager = AdsNonceManager(ttl_seconds=30, redis_client=redis_client)
+    user_id = uuid4()
+
+    nonce = manager.issue(user_id, "device-hash", "earn")
+    assert "{" not in redis_client.values[f"ads:nonce:{nonce}"]
+    record = manager.consume(user_id, nonce)
+    assert (record.device_hash, record.placement) == ("device-hash", "earn")
+
+    redis_client.values["ads:nonce:legacy"] = (
+        f'{{"uid": "{user_id}", "device": "d", "placement": "boost", "iat": 1700000000.5}}'
+    )
+    legacy = manager.consume(user_id, "legacy")
+    assert (legacy.device_hash, legacy.placement) == ("d", "boost")
+    assert legacy.issued_at.timestamp() == 1700000000.5
+
+
+def test_ads_nonce_manager_sweeps_expired_entries():
+    manager = AdsNonceManager(ttl_seconds=30)
+    for index in range(3):
+        manager._store[f"stale-{index}"] = ("uid", "device", "earn", 0.0)
+
+    nonce = manager.issue(uuid4(), "device-hash", "earn")
+
+    assert list(manager._store) == [nonce]
+
+    manager._store["stale"] = ("uid", "device", "earn", 0.0)
+    manager._store.move_to_end("stale", last=False)
+    with pytest.raises(AdsNonceError):
+        manager.consume(uuid4(), "unknown")
+    assert list(manager._store) == [nonce]
+
+
+def test_ads_reward_insert_rejects_reused_nonce(db_session: Session):
+    user = User(id=uuid4(), discord_id="ads", username="ads", coins=0)
+    db_session.add(user)
+    db_session.commit()
+    service = AdsService(db_session, AdsNonceManager(), redis_client=None, settings=get_settings())
+    values = dict(
+        user_id=user.id,
+        network="gma",
+        nonce="nonce-1",
+        reward_amount=5,
+        duration_sec=30,
+        placement="earn",
+        device_hash="device",
+        meta={},
+    )
+
+    assert service._load_user_and_event(user.id, "event-1") == (user, None)
+
+    reward_id = service._insert_reward(event_id="event-1", **values)
+    db_session.commit()
+    assert db_session.get(AdReward, reward_id) is not None
+    assert service._load_user_and_event(user.id, "event-1") == (user, reward_id)
+    assert service._load_user_and_event(uuid4(), "event-1") == (None, None)
+
+    with pytest.raises(HTTPException) as exc:
+        service._insert_reward(event_id="event-2", **values)
+    assert exc.value.status_code == 409
+
+
+def test_ads_lock_limits_creates_and_returns_scope_rows(db_session: Session):
+    user = User(id=uuid4(), discord_id="limits", username="limits", coins=0)
+    db_session.add(user)
+    db_session.commit()
+    service = AdsService(db_session, AdsNonceManager(), redis_client=None, settings=get_settings())
+    today = date.today()
+
+    limits = service._lock_limits(user.id, "device", today)
+    assert limits.user_limits.rewards == 0
+    assert limits.device_limits.device_rewards == 0
+    service._increment_limits(limits, datetime.now(timezone.utc))
+    db_session.commit()
+
+    again = service._lock_limits(user.id, "device", today)
+    assert again.user_limits.rewards == 1
+    assert again.device_limits.device_rewards == 1
+    assert db_session.scalar(select(func.count()).select_from(UserLimit)) == 2
+
+    snapshot = service._fetch_limits_snapshot(user.id, "device", today)
+    assert snapshot.user_limits.rewards == 1
+    assert snapshot.device_limits.device_rewards == 1
+    assert snapshot.last_reward_at is not None
+
+
+def test_ads_services_share_rate_limiters():
+    first = AdsService(None, AdsNonceManager(), redis_client=None, settings=get_settings())
+    second = AdsService(None, AdsNonceManager(), redis_client=None, settings=get_settings())
+
+    assert first.prepare_limiter is second.prepare_limiter
+    assert first.ssv_limiter is second.ssv_limiter
+    assert first.prepare_limiter is not first.ssv_limiter
+
+
+def test_ads_ip_policy_blocks_configured_networks():
+    settings = get_settings().model_copy(update={"blocked_ips": "10.0.0.0/8, 2001:db8::/32 bogus"})
+    service = AdsService(None, AdsNonceManager(), redis_client=None, settings=settings)
+
+    for ip in ("10.1.2.3", "2001:db8::1"):
+        with pytest.raises(HTTPException) as exc:
+            service._enforce_ip_policy(ip, None)
+        assert exc.value.status_code == 403
+
+    service._enforce_ip_policy("11.0.0.1", None)
+    service._enforce_ip_policy("2001:db9::1", None)
+    service._enforce_ip_policy("not-an-ip", None)
+
+
 def test_ssv_signature_verifier_hmac():
     settings = SimpleNamespace(ssv_secret="super-secret", ssv_public_key_path=None)
     verifier = SSVSignatureVerifier(settings)
@@ -201,3 +541,56 @@ def test_ssv_signature_requires_key():
             placement="earn",
             signature="irrelevant",
         )
+
+
+def test_worker_signature_matches_plain_hmac():
+    body = b'{"session_id": "abc"}'
+    timestamp = "1700000000"
+    expected = hmac.new(b"worker-secret", body + timestamp.encode(), hashlib.sha256).hexdigest()
+
+    assert compute_worker_signature("worker-secret", body, timestamp) == expected
+    assert verify_worker_signature("worker-secret", body, timestamp, expected)
+    # Verifying through the cached signing key twice must not drift.
+    signing_key = cached_signing_key(uuid4(), encrypt_secret("worker-secret"))
+    assert verify_worker_signature(signing_key, body, timestamp, expected)
+    assert verify_worker_signature(signing_key, body, timestamp, expected)
+    assert not verify_worker_signature("other-secret", body, timestamp, expected)
+    assert not verify_worker_signature("worker-secret", body, timestamp, "not-hex")
+
+
+def test_secret_roundtrip_and_cache_tracks_rotation():
+    token_id = uuid4()
+    first = encrypt_secret("alpha-token")
+    assert decrypt_secret(first) == "alpha-token"
+    assert cached_secret(token_id, first) == "alpha-token"
+
+    rotated = encrypt_secret("beta-token")
+    assert cached_secret(token_id, rotated) == "beta-token"
+
+
+def test_revoked_token_leaves_nothing_cached(db_session: Session):
+    service = TokenVaultService(db_session)
+    context = AuditContext(actor_user_id=None, ip=None, ua=None)
+    token = service.create_token(
+        label="worker", token_plain="worker-plain-secret", creator_user_id=None, context=context
+    )
+    cached_signing_key(token.id, token.token_ciphertext)
+    assert token.id in crypto_module._secret_cache
+
+    service.revoke_token(token.id, context=context)
+
+    assert token.id not in crypto_module._secret_cache
+    assert not any(
+        "worker-plain-secret" in entry[1] for entry in crypto_module._secret_cache.values()
+    )
+
+
+def test_rate_limiter_memory_bucket_limits_key():
+    RateLimiter(2, 3600).check_many(("ip:a", "user:a"))
+
+    limiter = RateLimiter(2, 3600)
+    limiter.check("ip:a")
+    limiter.check("ip:a")
+    with pytest.raises(HTTPException) as exc:
+        limiter.check("ip:a")
+    assert exc.value.status_code == 429